@@ -1,12 +1,16 @@
 # ingest_opendata_hcm.py
 # Usage:
 #   python ingest_opendata_hcm.py --input data/raw_opendata.xlsx --out data/opendata_hcm_clean.csv --sample 1000
+#   (.xlsx is streamed with openpyxl read-only mode, .csv with pandas chunks; output is written chunk by chunk)
 #
 import argparse
+import numpy as np
 import pandas as pd
 import re
 from datetime import datetime
 
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+
 # normalization helpers
 def normalize_company_name(name: str) -> str:
     if pd.isna(name):
@@ -32,13 +36,45 @@ def normalize_address(addr: str) -> str:
 def parse_date(d):
     # try known formats, otherwise return original string
     if pd.isna(d): return ""
-    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(str(d), fmt).date().isoformat()
         except:
             pass
     return str(d)
 
+# vectorized versions of the helpers above (same output), used on whole columns
+def normalize_company_names(names: pd.Series) -> pd.Series:
+    s = names.astype(object).where(names.notna(), "").astype(str).str.strip()
+    s = s.str.replace(r'\bCTY\b', 'Công ty', flags=re.IGNORECASE, regex=True)
+    s = s.str.replace(r'\bCP\b', 'Cổ phần', flags=re.IGNORECASE, regex=True)
+    s = s.str.replace(r'\bTNHH\b', 'Trách nhiệm hữu hạn', flags=re.IGNORECASE, regex=True)
+    s = s.str.replace('&', 'và', regex=False)
+    return s.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def normalize_addresses(addrs: pd.Series) -> pd.Series:
+    s = addrs.astype(object).where(addrs.notna(), "").astype(str).str.strip()
+    s = s.str.replace("TP. HCM", "TP. Hồ Chí Minh", regex=False)
+    s = s.str.replace("TP HCM", "TP. Hồ Chí Minh", regex=False)
+    return s.str.replace(r'\s+', ' ', regex=True)
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    raw = dates.astype(object).where(dates.notna(), "").astype(str)
+    out = pd.Series(None, index=raw.index, dtype=object)
+    todo = (raw != "").to_numpy().copy()
+    for fmt in DATE_FORMATS:
+        if not todo.any():
+            break
+        parsed = pd.to_datetime(raw[todo], format=fmt, errors="coerce")
+        ok = parsed.notna().to_numpy()
+        out[parsed.index[ok]] = parsed[ok].dt.strftime("%Y-%m-%d")
+        todo[todo] = ~ok
+    # rows no format matched (or outside the pandas datetime range) keep the scalar behaviour
+    rest = out.isna().to_numpy()
+    if rest.any():
+        out[rest] = [parse_date(d) if d != "" else "" for d in raw[rest]]
+    return out
+
 def process_df(df: pd.DataFrame):
     # adapt column names (robust to different headers)
     col_map = {}
@@ -63,25 +99,52 @@ def process_df(df: pd.DataFrame):
         if c not in df.columns:
             df[c] = ""
 
-    df["company_name_norm"] = df["company_name"].apply(normalize_company_name)
-    df["address_norm"] = df["address"].apply(normalize_address)
-    df["registration_date_norm"] = df["registration_date"].apply(parse_date)
+    df["company_name_norm"] = normalize_company_names(df["company_name"])
+    df["address_norm"] = normalize_addresses(df["address"])
+    df["registration_date_norm"] = parse_dates(df["registration_date"])
     df["canonical_key"] = (df["company_name_norm"].fillna("") + " | " + df["tax_id"].astype(str).fillna("")).str.lower()
     return df[["tax_id","company_name","company_name_norm","registration_date","registration_date_norm","company_type","address","address_norm","business_line","canonical_key"]]
 
+def read_chunks(path, chunksize):
+    # stream the input: openpyxl read-only mode for Excel, pandas chunks for CSV
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=str)
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h) if h is not None else "" for h in next(rows)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=header, dtype=object).fillna(np.nan)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, dtype=object).fillna(np.nan)
+    finally:
+        wb.close()
+
 def main(args):
-    # read excel - for big files use read_excel with chunksize via engine openpyxl is not streamable;
-    # if very large, recommend converting to CSV externally and then use pandas.read_csv with chunksize.
     print("Reading input:", args.input)
-    df = pd.read_excel(args.input, engine="openpyxl")
-    print("Rows read:", len(df))
-    df_clean = process_df(df)
-    # optionally save a smaller sample for development
-    if args.sample and args.sample > 0:
-        df_clean_sample = df_clean.head(args.sample)
-        df_clean_sample.to_csv(args.out.replace(".csv","_sample.csv"), index=False, encoding="utf-8-sig")
-        print("Saved sample:", args.out.replace(".csv","_sample.csv"))
-    df_clean.to_csv(args.out, index=False, encoding="utf-8-sig")
+    sample_path = args.out.replace(".csv","_sample.csv")
+    rows = 0
+    sample_rows = 0
+    for i, chunk in enumerate(read_chunks(args.input, args.chunksize)):
+        df_clean = process_df(chunk)
+        # first chunk creates the file (with BOM + header), later chunks append
+        mode, encoding = ("w", "utf-8-sig") if i == 0 else ("a", "utf-8")
+        df_clean.to_csv(args.out, mode=mode, header=(i == 0), index=False, encoding=encoding)
+        # optionally save a smaller sample for development
+        if args.sample and args.sample > 0 and sample_rows < args.sample:
+            part = df_clean.head(args.sample - sample_rows)
+            part.to_csv(sample_path, mode=mode, header=(i == 0), index=False, encoding=encoding)
+            sample_rows += len(part)
+        rows += len(chunk)
+        print(f"Rows processed: {rows}")
+    if sample_rows:
+        print("Saved sample:", sample_path)
     print("Saved clean CSV:", args.out)
 
 if __name__ == "__main__":
@@ -89,5 +152,6 @@ if __name__ == "__main__":
     p.add_argument("--input", required=True)
     p.add_argument("--out", required=True)
     p.add_argument("--sample", type=int, default=1000, help="save a small sample for dev")
+    p.add_argument("--chunksize", type=int, default=20000, help="rows per chunk kept in memory")
     args = p.parse_args()
     main(args)
@@ -1,12 +1,16 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
+import os
+import sys
+
+WIKIDATA_SPARQL_URL = "https://query.wikidata.org/sparql"
+
+# Client SPARQL dùng chung của v5: pool kết nối keep-alive, retry, cache TTL
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../v5"))
+from services.sparql_client import get_sparql_client
 
 def run_sparql(query):
     """Thực thi SPARQL và trả JSON kết quả."""
     try:
-        sparql = SPARQLWrapper("https://query.wikidata.org/sparql")
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        results = sparql.query().convert()
+        results = get_sparql_client().query_sync(WIKIDATA_SPARQL_URL, query)
 
         if not results["results"]["bindings"]:
             return "Không có kết quả phù hợp."
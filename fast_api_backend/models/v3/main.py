@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import re, json, requests
+import os, re, sys, json, requests
 from typing import Any, Dict, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -9,6 +9,11 @@ KG_NS = "http://example.org/ontology/"
 FUSEKI_URL = "http://localhost:3030/company_kg"
 LLAMA_API_URL = "http://localhost:11434/api/generate"
 
+# Client SPARQL dùng chung của v5: pool kết nối keep-alive, retry, cache TTL (như models/v2/sparql_runner.py).
+# Không có fallback: thiếu v5 thì lỗi ngay khi import thay vì âm thầm bỏ qua cache / pool.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../v5"))
+from services.sparql_client import get_sparql_client
+
 CLASS_MAP = {
     "sản phẩm": f"<{KG_NS}Product>",
     "nhân sự": f"<{KG_NS}Person>",
@@ -126,20 +131,14 @@ class SPARQLBuilder:
 
 # ------------------ FUSEKI CLIENT ------------------
 class FusekiClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, client=None):
         self.query_url = base_url.rstrip("/") + "/query"
+        self.client = client or get_sparql_client()
 
     def query(self, sparql: str):
         print("\n[DEBUG] SPARQL Query:\n", sparql)
-        r = requests.post(
-            self.query_url,
-            data={"query": sparql},
-            headers={"Accept": "application/sparql-results+json"}
-        )
-        if not r.ok:
-            print("[ERROR] Fuseki response:", r.text)
-            r.raise_for_status()
-        data = r.json()
+        # Cache TTL + pool kết nối của client dùng chung
+        data = self.client.query_sync(self.query_url, sparql, timeout=30)
         print("[DEBUG] Fuseki result keys:", list(data.keys()))
         return data
 
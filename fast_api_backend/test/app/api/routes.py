@@ -13,5 +13,5 @@ async def ask_question(req: QuestionRequest):
     # NLP parse -> SPARQL
     sparql_query = parse_question(req.question)
     # Run SPARQL query
-    answer = query_sparql(sparql_query)
+    answer = await query_sparql(sparql_query)
     return {"question": req.question, "answer": answer}
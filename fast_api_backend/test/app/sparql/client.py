@@ -1,13 +1,14 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
+import os
+import sys
 from app.config import SPARQL_ENDPOINT
 
-sparql = SPARQLWrapper(SPARQL_ENDPOINT)
+# Client SPARQL async dùng chung của v5 (thêm vào cuối sys.path để không che package app)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../v5"))
+from services.sparql_client import get_sparql_client
 
-def query_sparql(query: str):
-    sparql.setQuery(query)
-    sparql.setReturnFormat(JSON)
+async def query_sparql(query: str):
     try:
-        results = sparql.query().convert()
+        results = await get_sparql_client().query(SPARQL_ENDPOINT, query)
         # Trích xuất kết quả đơn giản
         answers = []
         for result in results["results"]["bindings"]:
@@ -1,14 +1,25 @@
-from fastapi import FastAPI, Query, UploadFile, File
+from fastapi import FastAPI, Query, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-import numpy as np
+from starlette.concurrency import run_in_threadpool
+import os
 import json
-import requests
-import time
+import asyncio
+import threading
 
-from sentence_transformers import SentenceTransformer
-from services.pdf_service import upload_embeddings_pdf
-from services.context_builder import build_prompt
+from services.embedding_service import get_embedding_service, MicroBatcher
+from services.pdf_service import save_upload_file, segment_store, EMBED_FILE
+from services.context_builder import gather_context, format_prompt
+from services.index_holder import IndexHolder
+from services.embedding_cache import QueryEmbeddingCache
+from services.answer_cache import SemanticAnswerCache
+from services.llm_client import OllamaClient
+from services.ingest_jobs import IngestJobManager
+from services.company_gazetteer import get_gazetteer
+from services.company_name_index import get_name_index
+from services.sparql_cache import get_sparql_cache
+from services.sparql_client import get_sparql_client
+from services.wikidata_cache import get_wikidata_cache
 
 # ============ Setup ============
 app = FastAPI(title="Company Knowledge Chatbot API")
@@ -21,41 +32,143 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-embeddings_model = SentenceTransformer("all-MiniLM-L6-v2")
-data = np.load("data/pdf_embeddings.npz", allow_pickle=True)
-chunk_vectors = data["embeddings"]
-metadata = data["metadata"]
+# 1 model embedding dùng chung cho cả process, nạp lười (xem services/embedding_service.py)
+embedding_service = get_embedding_service()
+# Câu hỏi đến cùng lúc được gom thành 1 batch encode thay vì nhiều lượt forward nhỏ
+query_batcher = MicroBatcher(embedding_service)
+# Câu hỏi lặp lại lấy embedding từ cache, không chạy lại model
+query_encoder = QueryEmbeddingCache(query_batcher, int(os.getenv("QUERY_CACHE_SIZE", "1024")))
+TOP_K = 3
+
+# "flat" = brute-force chính xác; "hnsw" / "ivf" = index gần đúng (faiss) lưu cạnh file npz
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+index_holder = IndexHolder(
+    segment_store, INDEX_TYPE, EMBED_FILE,
+    ann_params={
+        "ef_search": int(os.getenv("ANN_EF_SEARCH", "64")),
+        "nprobe": int(os.getenv("ANN_NPROBE", "16")),
+    },
+    # BM25 trên texts trộn với dense (RRF): bắt tên riêng, mã số thuế, "Điều 5"...
+    hybrid=os.getenv("HYBRID_SEARCH", "1") == "1",
+)
+index_holder.load()
+
+# Phát lại câu trả lời cho câu hỏi gần giống + cùng context; xoá khi dữ liệu chunk thay đổi
+answer_cache = SemanticAnswerCache(
+    max_distance=float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05")),
+    ttl=int(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+)
+index_holder.add_listener(answer_cache.invalidate)
+
+# Upload PDF chạy thành job nền (process pool + hàng đợi có giới hạn), xong thì refresh index
+ingest_jobs = IngestJobManager(
+    segment_store,
+    on_indexed=index_holder.refresh,
+    max_workers=int(os.getenv("INGEST_WORKERS", "2")),
+    max_queue=int(os.getenv("INGEST_MAX_QUEUE", "16")),
+)
 
 GPT_OSS_LOCAL_URL = "http://localhost:11434/api/generate"
+# 1 client async dùng chung cho mọi /ask_stream: pool keep-alive + giới hạn stream đồng thời
+llm_client = OllamaClient(
+    GPT_OSS_LOCAL_URL,
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "64")),
+)
+
+@app.on_event("startup")
+def start_background_jobs():
+    segment_store.start_compaction()
+    # Bắt cả segment được ghi bởi process khác (vd. worker khác, script bulk)
+    index_holder.start_watcher()
+    # Nạp model trong nền: server nhận request ngay, câu hỏi đầu tiên chờ model nếu chưa xong
+    threading.Thread(target=embedding_service.warmup, name="embedding-warmup", daemon=True).start()
+    threading.Thread(target=get_gazetteer, name="gazetteer-warmup", daemon=True).start()
+    threading.Thread(target=get_name_index, name="name-index-warmup", daemon=True).start()
+
+@app.on_event("startup")
+async def start_ingest_jobs():
+    await ingest_jobs.start()
+
+@app.on_event("shutdown")
+async def close_clients():
+    await ingest_jobs.shutdown()
+    await llm_client.aclose()
+    query_batcher.close()
+    get_sparql_client().close()
 
 # ============ Routes ============
 
-def stream_gpt_response(prompt: str):
-    payload = {"prompt": prompt, "max_tokens": 512, "model": "gpt-oss:120b-cloud", "stream": True}
+def sse_event(token: str):
+    return f"data:{json.dumps({'token': token})}\n\n"
+
+
+async def stream_gpt_response(prompt: str, on_complete=None):
+    """Stream token từ GPT-OSS; on_complete(tokens) chỉ được gọi khi stream kết thúc bình thường."""
+    tokens = []
     try:
-        with requests.post(GPT_OSS_LOCAL_URL, json=payload, stream=True, timeout=300) as r:
-            r.raise_for_status()
-            for line in r.iter_lines():
-                if line:
-                    try:
-                        token = json.loads(line.decode("utf-8")).get("response", "")
-                        if token:
-                            yield f"data:{json.dumps({'token': token})}\n\n"
-                    except json.JSONDecodeError:
-                        continue
-                time.sleep(0.005)
+        async for token in llm_client.stream(prompt, max_tokens=512):
+            tokens.append(token)
+            yield sse_event(token)
     except Exception as e:
-        yield f"data:{json.dumps({'token': f'[Lỗi GPT-OSS]: {e}'})}\n\n"
+        yield sse_event(f"[Lỗi GPT-OSS]: {e}")
+        return
+    if on_complete:
+        on_complete(tokens)
+
+
+async def replay_tokens(tokens):
+    for token in tokens:
+        yield sse_event(token)
 
 
 @app.get("/ask_stream")
-def ask_stream(question: str = Query(...)):
-    prompt = build_prompt(question, embeddings_model, chunk_vectors, metadata, 0.6)
+async def ask_stream(question: str = Query(...)):
+    # Lấy generation trước khi truy xuất: nếu dữ liệu đổi giữa chừng, câu trả lời không được lưu
+    generation = answer_cache.generation
+    # Encode + Fuseki + Wikidata chạy song song trên event loop, mỗi nguồn có hạn chót riêng
+    # (services/context_builder.py); không chiếm thread của threadpool trong lúc chờ
+    gathered = await gather_context(question, query_encoder, index_holder.get(), 0.6, TOP_K, llm=llm_client)
+    query_vec, context = gathered["query_vec"], gathered["context"]
+    prompt = format_prompt(question, context)
     print("Prompt", prompt)
-    return StreamingResponse(stream_gpt_response(prompt), media_type="text/event-stream")
+    headers = {"X-Context-Timeouts": ",".join(gathered["timed_out"])} if gathered["timed_out"] else None
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    return await upload_embeddings_pdf(file)
+    cached = answer_cache.lookup(query_vec, context) if query_vec is not None else None
+    if cached is not None:
+        return StreamingResponse(replay_tokens(cached), media_type="text/event-stream", headers=headers)
 
+    # Context thiếu nguồn do quá hạn -> không lưu câu trả lời để lần sau phát lại
+    on_complete = None
+    if query_vec is not None and not gathered["timed_out"]:
+        on_complete = lambda tokens: answer_cache.store(query_vec, context, tokens, generation)
+    return StreamingResponse(stream_gpt_response(prompt, on_complete), media_type="text/event-stream",
+                             headers=headers)
+
+@app.get("/cache_stats")
+def cache_stats():
+    return {
+        "query_embeddings": query_encoder.stats(),
+        "query_batches": query_batcher.stats(),
+        "answers": answer_cache.stats(),
+        "sparql": get_sparql_cache().stats(),
+        "wikidata": get_wikidata_cache().stats(),
+    }
+
+@app.post("/upload_pdf", status_code=202)
+async def upload_pdf(file: UploadFile = File(...)):
+    pdf_path = await run_in_threadpool(save_upload_file, file)
+    try:
+        job = ingest_jobs.submit(pdf_path, file.filename)
+    except asyncio.QueueFull:
+        os.remove(pdf_path)
+        raise HTTPException(status_code=503, detail="Hàng đợi xử lý PDF đang đầy, vui lòng thử lại sau.")
+    return {"job_id": job["id"], "status": job["status"]}
 
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job.")
+    return job
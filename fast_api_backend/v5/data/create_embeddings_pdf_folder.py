@@ -1,20 +1,38 @@
 import os
 import re
+import argparse
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from PyPDF2 import PdfReader
-from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
 # =========================== Cấu hình mặc định ===========================
 DEFAULT_PDF_DIR = "data_pdf"
 DEFAULT_OUT_FILE = "pdf_embeddings.npz"
 DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_BULK_OUT_DIR = "data/segments_bulk"
+DEFAULT_STORE_DIR = "data/segments"
+DEFAULT_LEGACY_FILE = "data/pdf_embeddings.npz"
+DEFAULT_BATCH_SIZE = 256       # số section mỗi lần encode
+DEFAULT_FLUSH_ROWS = 8192      # số section mỗi segment ghi ra đĩa
+# Chunk theo token của tokenizer model embedding (MiniLM cắt ở 256 token)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+CHUNK_TOKENIZER = os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL)
 
 
-def extract_text_from_pdf(file_path):
+def count_pdf_pages(file_path):
+    return len(PdfReader(file_path).pages)
+
+
+def extract_text_from_pdf(file_path, start=0, end=None):
+    """Text của các trang [start, end) (mặc định: cả file)."""
     reader = PdfReader(file_path)
     text = ""
-    for page in reader.pages:
+    for page in reader.pages[start:end]:
         page_text = page.extract_text()
         if page_text:
             text += page_text + "\n"
@@ -28,7 +46,7 @@ def split_into_sections(text):
     """
     lines = text.splitlines()
     sections = []
-    current_section = ""
+    current_lines = []
     current_title = "Untitled"
 
     title_pattern = re.compile(r"^(Mục|Điều|Chương|Phần|Section|\d+[\.\)]|[A-Z\s]{4,})")
@@ -40,26 +58,295 @@ def split_into_sections(text):
 
         # Nếu dòng có vẻ là tiêu đề mới
         if title_pattern.match(stripped):
-            if current_section:
-                sections.append({"title": current_title, "content": current_section.strip()})
+            if current_lines:
+                sections.append({"title": current_title, "content": " ".join(current_lines)})
             current_title = stripped
-            current_section = ""
+            current_lines = []
         else:
-            current_section += stripped + " "
+            current_lines.append(stripped)
 
-    if current_section:
-        sections.append({"title": current_title, "content": current_section.strip()})
+    if current_lines:
+        sections.append({"title": current_title, "content": " ".join(current_lines)})
 
     return sections
 
 
-def main():
-    pdf_dir = DEFAULT_PDF_DIR
-    out_path = DEFAULT_OUT_FILE
-    model_name = DEFAULT_MODEL
+# =========================== Chunk theo token ===========================
+_tokenizers = {}
+
+
+def get_tokenizer(model_name=CHUNK_TOKENIZER):
+    """Tokenizer của model embedding (None nếu không nạp được -> đếm token xấp xỉ)."""
+    if model_name not in _tokenizers:
+        try:
+            from transformers import AutoTokenizer
+            repo = model_name if "/" in model_name or os.path.isdir(model_name) else f"sentence-transformers/{model_name}"
+            _tokenizers[model_name] = AutoTokenizer.from_pretrained(repo)
+        except Exception as e:
+            print(f"[WARN] Không nạp được tokenizer {model_name} ({e}), dùng đếm token xấp xỉ")
+            _tokenizers[model_name] = None
+    return _tokenizers[model_name]
+
+
+def count_word_tokens(words, tokenizer=None):
+    """Số token của từng từ (tách theo khoảng trắng nên tổng = số token của cả đoạn)."""
+    if not words:
+        return []
+    if tokenizer is None:
+        return [len(re.findall(r"\w+|[^\w\s]", w)) or 1 for w in words]
+    return [len(ids) for ids in tokenizer(words, add_special_tokens=False)["input_ids"]]
+
+
+def chunk_words(words, counts, budget, overlap):
+    """
+    Gom từ thành các chunk <= budget token, chunk sau lặp lại ~overlap token cuối của chunk trước.
+    Trả về list (start, end) theo chỉ số từ.
+    """
+    chunks = []
+    start, n = 0, len(words)
+    while start < n:
+        end, used = start, 0
+        while end < n and (used + counts[end] <= budget or end == start):
+            used += counts[end]
+            end += 1
+        chunks.append((start, end))
+        if end >= n:
+            break
+        # Lùi lại vài từ để tạo phần chồng lấn, nhưng luôn tiến ít nhất 1 từ
+        back, carried = end, 0
+        while back > start + 1 and carried + counts[back - 1] <= overlap:
+            back -= 1
+            carried += counts[back]
+        start = back
+    return chunks
+
+
+def chunk_section(section, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, tokenizer=None):
+    """
+    Chia 1 section thành các chunk "tiêu đề\nnội dung" không vượt quá max_tokens token
+    (tính cả tiêu đề và 2 token đặc biệt của encoder).
+    Trả về (tiêu đề đã rút gọn, list nội dung chunk không kèm tiêu đề).
+    """
+    title_words = section["title"].split()
+    title_counts = count_word_tokens(title_words, tokenizer)
+    # Tiêu đề quá dài chỉ giữ phần đầu để còn chỗ cho nội dung
+    title_budget, used, keep = max_tokens // 4, 0, 0
+    for c in title_counts:
+        if used + c > title_budget:
+            break
+        used, keep = used + c, keep + 1
+    title = " ".join(title_words[:keep]) or section["title"][:50]
 
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    words = section["content"].split()
+    budget = max(max_tokens - used - 2, 8)
+    counts = count_word_tokens(words, tokenizer)
+    overlap = min(overlap, budget // 2)
+    return title, [" ".join(words[s:e]) for s, e in chunk_words(words, counts, budget, overlap)]
+
+
+def build_section_records(sections, source, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Section -> (texts để embed, metadata) theo đúng format lưu trong npz.
+    Mỗi section được chia thành các chunk giới hạn số token; text đầy đủ của chunk
+    nằm trong texts, metadata giữ tiêu đề section và vị trí chunk.
+    """
+    tokenizer = get_tokenizer()
+    texts, metadata = [], []
+    for idx, sec in enumerate(sections):
+        title, chunks = chunk_section(sec, max_tokens, overlap, tokenizer)
+        for chunk_id, chunk in enumerate(chunks):
+            texts.append(f"{title}\n{chunk}")
+            metadata.append({
+                "source": source,
+                "section_id": idx,
+                "section_title": sec["title"],
+                "chunk_id": chunk_id,
+                "text_preview": chunk[:200]
+            })
+    return texts, metadata
+
+
+def extract_sections_from_pdf(pdf_path):
+    """Chạy trong process worker: đọc 1 PDF -> (texts, metadata)."""
+    text = extract_text_from_pdf(pdf_path)
+    return build_section_records(split_into_sections(text), os.path.basename(pdf_path))
+
+
+def _bounded_map(pool, fn, items, max_in_flight):
+    """Như pool.map nhưng chỉ giữ tối đa max_in_flight task chờ, kết quả theo thứ tự."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_ranges(row_files, hashes):
+    """Tên file theo từng dòng -> {"tên": {"sha256", "rows": [start, end)}}."""
+    files = {}
+    for i, name in enumerate(row_files):
+        if name in files:
+            files[name]["rows"][1] = i + 1
+        else:
+            files[name] = {"sha256": hashes.get(name), "rows": [i, i + 1]}
+    return files
+
+
+def index_pdfs(store, pdf_dir, pdf_files, hashes, model_name=DEFAULT_MODEL, workers=None,
+               batch_size=DEFAULT_BATCH_SIZE, flush_rows=DEFAULT_FLUSH_ROWS):
+    """
+    Index danh sách PDF vào SegmentStore với bộ nhớ bị chặn:
+    - process pool đọc PDF + tách section (tối đa 2 * workers PDF đang chờ),
+    - section được encode theo batch cố định,
+    - cứ flush_rows section thì ghi 1 segment (kèm hash + khoảng dòng của từng file;
+      hash chỉ được ghi khi mọi dòng của file đã nằm trên đĩa).
+    Trả về số section đã index.
+    """
+    from services.embedding_service import get_embedding_service
 
+    workers = workers or os.cpu_count() or 1
+    pending_texts, pending_meta, pending_files = [], [], []
+    out_vecs, out_meta, out_texts, out_files = [], [], [], []
+    total = 0
+
+    def encode_batch(model, n):
+        out_vecs.append(model.encode(pending_texts[:n], batch_size=batch_size))
+        out_meta.extend(pending_meta[:n])
+        out_texts.extend(pending_texts[:n])
+        out_files.extend(pending_files[:n])
+        del pending_texts[:n], pending_meta[:n], pending_files[:n]
+
+    def flush():
+        if out_meta:
+            # File còn dòng chưa ghi (đang chờ encode) chỉ được ghi hash ở segment chứa dòng cuối:
+            # chết giữa chừng thì lần sync sau thấy hash lệch và index lại cả file
+            unfinished = set(pending_files)
+            done = {f: hashes.get(f) for f in set(out_files) if f not in unfinished}
+            store.append(np.concatenate(out_vecs), out_meta, out_texts, _file_ranges(out_files, done))
+            out_vecs.clear()
+            out_meta.clear()
+            out_texts.clear()
+            out_files.clear()
+
+    # spawn: với fork, worker chỉ được tạo ở lần submit() đầu tiên (sau khi đã nạp model) nên
+    # sẽ mang theo torch + model và dễ treo OpenMP / tokenizers sau fork (giống ingest_jobs)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        model = get_embedding_service(model_name)
+        model.warmup()
+        results = _bounded_map(pool, extract_sections_from_pdf,
+                               (os.path.join(pdf_dir, f) for f in pdf_files), 2 * workers)
+        for pdf_file, (texts, metadata) in tqdm(zip(pdf_files, results), total=len(pdf_files), desc="PDF"):
+            pending_texts.extend(texts)
+            pending_meta.extend(metadata)
+            pending_files.extend([pdf_file] * len(texts))
+            while len(pending_texts) >= batch_size:
+                total += batch_size
+                encode_batch(model, batch_size)
+                if len(out_meta) >= flush_rows:
+                    flush()
+
+        if pending_texts:
+            total += len(pending_texts)
+            encode_batch(model, len(pending_texts))
+        flush()
+
+    return total
+
+
+def list_pdfs(pdf_dir):
+    return sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+
+
+def bulk_index(pdf_dir, out_dir, model_name=DEFAULT_MODEL, workers=None,
+               batch_size=DEFAULT_BATCH_SIZE, flush_rows=DEFAULT_FLUSH_ROWS):
+    """Index cả thư mục PDF vào 1 SegmentStore mới tại out_dir."""
+    from services.segment_store import SegmentStore
+
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        raise FileExistsError(f"Thư mục '{out_dir}' đã có dữ liệu, hãy chọn thư mục mới")
+
+    pdf_files = list_pdfs(pdf_dir)
+    if not pdf_files:
+        print(f"[ERROR] Không tìm thấy PDF trong thư mục '{pdf_dir}'")
+        return None
+
+    store = SegmentStore(out_dir)
+    hashes = {f: file_sha256(os.path.join(pdf_dir, f)) for f in pdf_files}
+    total = index_pdfs(store, pdf_dir, pdf_files, hashes, model_name, workers, batch_size, flush_rows)
+
+    store.compact(small_rows=flush_rows)
+    print(f"\n✅ Bulk index: {total} mục từ {len(pdf_files)} PDF -> {out_dir}")
+    print(f"   Chạy server với SEGMENT_DIR={os.path.abspath(out_dir)} để dùng dữ liệu mới.")
+    return store
+
+
+def sync_index(pdf_dir, store_dir, legacy_file=None, model_name=DEFAULT_MODEL, workers=None,
+               batch_size=DEFAULT_BATCH_SIZE, flush_rows=DEFAULT_FLUSH_ROWS):
+    """
+    Đồng bộ tăng dần thư mục PDF với SegmentStore theo sha256 nội dung:
+    - file mới / đổi nội dung -> xoá dòng cũ (nếu có) rồi index lại,
+    - file đã bị xoá khỏi thư mục -> xoá các dòng của nó,
+    - file không đổi -> bỏ qua.
+    Dữ liệu cũ chưa có hash (vd. pdf_embeddings.npz) bị thay khi trùng tên file
+    và bị xoá khi file không còn trong thư mục.
+    """
+    from services.segment_store import SegmentStore
+
+    store = SegmentStore(store_dir, legacy_file=legacy_file)
+    indexed = store.indexed_files()
+    current = {f: file_sha256(os.path.join(pdf_dir, f)) for f in list_pdfs(pdf_dir)}
+
+    changed = [f for f, h in current.items() if f not in indexed or indexed[f]["sha256"] != h]
+    deleted = sorted(store.source_names() - set(current))
+    print(f"[INFO] Sync: {len(changed)} file mới/đổi, {len(deleted)} file đã xoá, "
+          f"{len(current) - len(changed)} file giữ nguyên")
+
+    store.remove_files(changed + deleted)
+    total = index_pdfs(store, pdf_dir, changed, current, model_name, workers, batch_size, flush_rows) if changed else 0
+    store.compact(small_rows=flush_rows)
+    print(f"\n✅ Sync xong: {total} mục mới -> {store_dir}")
+    return store
+
+
+def main(args=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    p.add_argument("--out", default=DEFAULT_OUT_FILE, help="file npz (chế độ thường)")
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--bulk", action="store_true", help="index song song, ghi segment dần dần")
+    p.add_argument("--out-dir", default=DEFAULT_BULK_OUT_DIR, help="thư mục SegmentStore (chế độ --bulk)")
+    p.add_argument("--incremental", action="store_true", help="chỉ index lại PDF mới/đổi, xoá PDF đã mất")
+    p.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="SegmentStore của server (chế độ --incremental)")
+    p.add_argument("--legacy-file", default=DEFAULT_LEGACY_FILE)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    p.add_argument("--flush-rows", type=int, default=DEFAULT_FLUSH_ROWS)
+    args = p.parse_args(args)
+
+    if args.incremental:
+        sync_index(args.pdf_dir, args.store_dir, args.legacy_file, args.model,
+                   args.workers, args.batch_size, args.flush_rows)
+        return
+    if args.bulk:
+        bulk_index(args.pdf_dir, args.out_dir, args.model, args.workers, args.batch_size, args.flush_rows)
+        return
+
+    pdf_dir = args.pdf_dir
+    out_path = args.out
+    model_name = args.model
+
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
     pdf_files = [f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")]
     if not pdf_files:
         print(f"[ERROR] Không tìm thấy PDF trong thư mục '{pdf_dir}'")
@@ -73,20 +360,15 @@ def main():
         text = extract_text_from_pdf(pdf_path)
         sections = split_into_sections(text)
 
-        for idx, sec in enumerate(sections):
-            combined_text = f"{sec['title']}\n{sec['content']}"
-            all_texts.append(combined_text)
-            metadata.append({
-                "source": pdf_file,
-                "section_id": idx,
-                "section_title": sec["title"],
-                "text_preview": sec["content"][:200]
-            })
+        texts, records = build_section_records(sections, pdf_file)
+        all_texts.extend(texts)
+        metadata.extend(records)
 
     print(f"\n✅ Tổng cộng {len(all_texts)} mục được trích xuất từ {len(pdf_files)} PDF.")
 
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(all_texts, show_progress_bar=True, convert_to_numpy=True)
+    from services.embedding_service import get_embedding_service
+
+    embeddings = get_embedding_service(model_name).encode(all_texts, show_progress_bar=True)
 
     np.savez_compressed(out_path,
                         embeddings=embeddings,
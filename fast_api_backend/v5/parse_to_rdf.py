@@ -1,9 +1,12 @@
+import numpy as np
 import pandas as pd
 import PyPDF2
 import json
 import requests
 from rdflib import Graph, Literal, RDF, XSD, Namespace, URIRef
 import re
+from services.sparql_cache import invalidate_dataset
+from services.nt_writer import RDF_TYPE, XSD as XSD_IRI, iri_terms, literal_terms, triple_lines, write_ntriples
 
 # -------------------------- Namespace --------------------------
 EX = Namespace("http://example.org/company#")
@@ -91,12 +94,66 @@ def generate_rdf(data_list, entity_type="Company", output_file="output.ttl"):
     print(f"RDF saved to {output_file}")
     return g
 
+# -------------------------- Generate N-Triples (theo cột) --------------------------
+def entities_ntriples(entity_type, records, subjects):
+    """
+    Như json_to_rdf nhưng xử lý cả danh sách records cùng lúc, mỗi thuộc tính là 1 cột:
+    escape literal / dựng IRI bằng thao tác chuỗi pandas, không tạo Literal/URIRef cho từng ô.
+    subjects: Series term '<iri>' tương ứng từng record. Trả về list Series dòng N-Triples.
+    """
+    parts = [subjects + f" <{RDF_TYPE}> <{EX}{entity_type}> .\n"]
+
+    for prop, prop_info in mapping[entity_type]["properties"].items():
+        json_path = prop_info["jsonPath"].strip("$.{}")
+        values = pd.Series([r.get(json_path) for r in records], index=subjects.index, dtype=object)
+
+        if prop_info["type"].startswith("xsd:"):
+            mask = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+            if mask.any():
+                datatype = XSD_IRI + prop_info["type"].split(":")[1]
+                parts.append(triple_lines(subjects[mask], f"{EX}{prop}", literal_terms(values[mask], datatype)))
+
+        elif prop_info["type"] in ("object", "objectArray"):
+            obj_class = prop_info["class"]
+            parents, children = [], []
+            for subject, value in zip(subjects, values):
+                if not value:
+                    continue
+                for item in (value if prop_info["type"] == "objectArray" else [value]):
+                    parents.append(subject)
+                    children.append(item)
+            if not children:
+                continue
+            child_subjects = iri_terms(f"{EX}{obj_class}_", pd.Series([c.get("name", "id") for c in children]))
+            parts.append(triple_lines(pd.Series(parents, dtype=object), f"{EX}{prop}", child_subjects))
+            parts.extend(entities_ntriples(obj_class, children, child_subjects))
+
+    return parts
+
+
+def generate_ntriples(data_list, entity_type="Company", output_file="output.nt"):
+    """Ghi N-Triples (giống generate_rdf, không dựng Graph) ra file. Trả về số triple."""
+    subjects = iri_terms(
+        f"{EX}{entity_type}_",
+        pd.Series([item.get("businessCode", item.get("name", "id")) for item in data_list], dtype=object),
+    )
+    parts = entities_ntriples(entity_type, data_list, subjects) if data_list else []
+    # Graph rdflib là tập hợp: bỏ triple trùng (vd. cùng 1 Executive ở nhiều công ty)
+    lines = pd.unique(np.concatenate([p.to_numpy(dtype=object) for p in parts])) if parts else []
+    with open(output_file, "wb") as f:
+        write_ntriples("".join(lines), f)
+    print(f"RDF saved to {output_file} ({len(lines)} triples)")
+    return len(lines)
+
 # -------------------------- Upload to Fuseki --------------------------
 def upload_to_fuseki(rdf_file, fuseki_url):
     with open(rdf_file, "rb") as f:
-        headers = {"Content-Type": "text/turtle"}
+        content_type = "application/n-triples" if rdf_file.endswith(".nt") else "text/turtle"
+        headers = {"Content-Type": content_type}
         r = requests.post(fuseki_url, data=f, headers=headers)
     print(f"Upload status: {r.status_code} {r.text}")
+    if r.ok:
+        invalidate_dataset(fuseki_url)
 
 # -------------------------- Main Example --------------------------
 if __name__ == "__main__":
@@ -115,8 +172,8 @@ if __name__ == "__main__":
     else:
         data = []
 
-    rdf_file = "companies.ttl"
-    g = generate_rdf(data, "Company", rdf_file)
+    rdf_file = "companies.nt"
+    generate_ntriples(data, "Company", rdf_file)
 
     # --- Upload to Fuseki ---
     FUSEKI_URL = "http://localhost:3030/your_dataset/data"
@@ -0,0 +1,28 @@
+import argparse
+from services.ann_index import ANN_TYPES, AnnIndex
+from services.segment_store import SegmentStore
+
+# Chạy từ thư mục v5:  python -m scripts.build_ann_index --type hnsw
+p = argparse.ArgumentParser()
+p.add_argument("--embed-file", default="data/pdf_embeddings.npz")
+p.add_argument("--segment-dir", default="data/segments")
+p.add_argument("--type", choices=ANN_TYPES, default="hnsw")
+p.add_argument("--m", type=int, default=32)
+p.add_argument("--ef-construction", type=int, default=200)
+p.add_argument("--ef-search", type=int, default=64)
+p.add_argument("--nlist", type=int, default=None)
+p.add_argument("--nprobe", type=int, default=16)
+args = p.parse_args()
+
+# Build trên toàn bộ SegmentStore (như server), lưu kèm fingerprint để server dùng lại được
+store = SegmentStore(args.segment_dir, legacy_file=args.embed_file)
+manifest = store.manifest()
+embeddings, metadata, texts = store.load_all(manifest["segments"])
+if args.type == "hnsw":
+    params = {"m": args.m, "ef_construction": args.ef_construction, "ef_search": args.ef_search}
+else:
+    params = {"nlist": args.nlist, "nprobe": args.nprobe}
+
+index = AnnIndex.build(embeddings, metadata, texts, args.type, **params)
+path = index.save(args.embed_file, store.fingerprint(manifest))
+print(f"✅ Đã build index {args.type} với {len(index)} vector -> {path}")
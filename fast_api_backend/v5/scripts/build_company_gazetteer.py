@@ -0,0 +1,39 @@
+import argparse
+import pandas as pd
+from services.company_gazetteer import GAZETTEER_FILE, update_company_names
+from scripts.bulk_load_fuseki import iter_chunks
+from services.search_company_ontology import FUSEKI_QUERY_URL
+from services.sparql_client import get_sparql_client
+
+# Chạy từ thư mục v5:  python -m scripts.build_company_gazetteer
+# Tạo file tên công ty (gazetteer + index trigram tên -> IRI) từ dữ liệu đã có trong Fuseki
+# (hoặc từ file Excel).
+p = argparse.ArgumentParser()
+p.add_argument("--excel", default=None, help="đọc cột IdCompany / Name từ file Excel / CSV thay vì Fuseki")
+p.add_argument("--out", default=GAZETTEER_FILE)
+args = p.parse_args()
+
+if args.excel:
+    # Đọc như scripts.bulk_load_fuseki (IdCompany là chuỗi, không thành 313587386.0)
+    # để IRI dựng từ id khớp với IRI đã nạp vào Fuseki
+    records = []
+    for df in iter_chunks(args.excel, 50000):
+        df = df[df["Name"].notna()]
+        records.extend(
+            {"id": str(i) if pd.notna(i) else None, "name": str(n)}
+            for i, n in df[["IdCompany", "Name"]].itertuples(index=False)
+        )
+else:
+    query = """
+    PREFIX ex: <http://example.com/company#>
+    SELECT ?company ?id ?name WHERE { ?company a ex:Company ; ex:name ?name . OPTIONAL { ?company ex:idCompany ?id } }
+    """
+    # Dump toàn bộ tên: không ghi vào SparqlCache
+    data = get_sparql_client().query_sync(FUSEKI_QUERY_URL, query, timeout=300, use_cache=False)
+    records = [
+        {"id": b.get("id", {}).get("value"), "name": b["name"]["value"], "iri": b["company"]["value"]}
+        for b in data["results"]["bindings"]
+    ]
+
+total = update_company_names(records, args.out)
+print(f"✅ Gazetteer: {len(records)} tên đọc được, {total} tên trong {args.out}")
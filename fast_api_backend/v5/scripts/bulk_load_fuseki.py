@@ -0,0 +1,223 @@
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import requests
+
+# Cho phép import services/* khi chạy trực tiếp từ thư mục scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from services.company_gazetteer import update_company_names
+from services.sparql_cache import invalidate_dataset
+from services.nt_writer import XSD_STRING, table_ntriples
+
+# Nạp toàn bộ danh bạ doanh nghiệp (Excel / CSV) vào Fuseki theo từng lô N-Triples:
+#   python -m scripts.bulk_load_fuseki --input ../data_excel/DoanhNghiepHCM.xlsx
+# Đọc file theo chunk (không nạp cả workbook vào RAM), mỗi chunk -> 1 lô N-Triples nén gzip
+# POST vào Graph Store endpoint, tối đa --workers lô cùng lúc. Chunk đã nạp được ghi vào
+# file checkpoint nên chạy lại sẽ bỏ qua (nạp lại 1 lô cũng vô hại: triple trùng bị gộp).
+
+# ========================
+# CONFIG
+# ========================
+FUSEKI_DATA_URL = "http://localhost:3030/companies/data"  # endpoint /data (Graph Store Protocol)
+COMPANY_IRI_BASE = "http://example.com/company/"
+EX = "http://example.com/company#"
+# Cột Excel -> thuộc tính ex:..., giống scripts/import_excel_to_fuseki.py
+COLUMNS = {
+    "IdCompany": "idCompany",
+    "Name": "name",
+    "LatestLegalRegistration": "latestLegalRegistration",
+    "Type": "type",
+    "Address": "address",
+    "Business": "business",
+}
+MAX_RETRIES = 3
+
+
+# ========================
+# ĐỌC FILE THEO CHUNK
+# ========================
+def iter_chunks(path, chunk_rows):
+    """Sinh DataFrame từng chunk_rows dòng từ .csv hoặc .xlsx (openpyxl read-only, đọc tuần tự)."""
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False, na_values=[""])
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h) if h is not None else "" for h in next(rows)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield _excel_frame(batch, header)
+                batch = []
+        if batch:
+            yield _excel_frame(batch, header)
+    finally:
+        wb.close()
+
+
+def _id_string(value):
+    # Ô số của Excel có thể là float (313587386.0) -> "313587386", giống đường CSV (dtype=str)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _excel_frame(batch, header):
+    """dtype=object: pandas không được suy ra float64 cho cột số có ô trống (IdCompany -> 313587386.0)."""
+    df = pd.DataFrame(batch, columns=header, dtype=object)
+    if "IdCompany" in df.columns:
+        df["IdCompany"] = df["IdCompany"].map(_id_string, na_action="ignore")
+    return df
+
+
+# ========================
+# CHUNK -> N-TRIPLES
+# ========================
+def company_ntriples(df: pd.DataFrame):
+    """Trả về (chuỗi N-Triples của chunk, số triple) — ghép theo cột, không dựng rdflib Graph."""
+    properties = {column: (EX + prop, XSD_STRING) for column, prop in COLUMNS.items()}
+    return table_ntriples(df, "IdCompany", COMPANY_IRI_BASE, EX + "Company", properties)
+
+
+# ========================
+# POST LÔ VÀO FUSEKI
+# ========================
+_local = threading.local()
+
+
+def _session():
+    # requests.Session giữ kết nối keep-alive; mỗi thread 1 session
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def post_batch(endpoint, body: str, use_gzip=True, timeout=300):
+    data = body.encode("utf-8")
+    headers = {"Content-Type": "application/n-triples"}
+    if use_gzip:
+        data = gzip.compress(data, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            r = _session().post(endpoint, data=data, headers=headers, timeout=timeout)
+            if r.status_code in (200, 201, 204):
+                return
+            if r.status_code < 500 or attempt == MAX_RETRIES:
+                raise RuntimeError(f"Fuseki trả về {r.status_code}: {r.text[:200]}")
+        except requests.ConnectionError:
+            if attempt == MAX_RETRIES:
+                raise
+        time.sleep(2 ** attempt)
+
+
+# ========================
+# CHECKPOINT
+# ========================
+def load_checkpoint(path, input_path, chunk_rows):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("input") != os.path.abspath(input_path) or state.get("chunk_rows") != chunk_rows:
+        print(f"[WARN] Checkpoint {path} thuộc lần chạy khác (file / chunk-rows) -> nạp lại từ đầu")
+        return set()
+    return set(state.get("done", []))
+
+
+def save_checkpoint(path, input_path, chunk_rows, done):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "chunk_rows": chunk_rows, "done": sorted(done)}, f)
+    os.replace(tmp, path)
+
+
+# ========================
+# MAIN
+# ========================
+def bulk_load(input_path, endpoint=FUSEKI_DATA_URL, chunk_rows=5000, workers=4, checkpoint=None,
+              use_gzip=True, limit=None):
+    checkpoint = checkpoint or input_path + ".checkpoint.json"
+    done = load_checkpoint(checkpoint, input_path, chunk_rows)
+    if done:
+        print(f"[INFO] Checkpoint: bỏ qua {len(done)} chunk đã nạp")
+
+    names = []
+    pending = {}   # future -> (chunk, số triple)
+    loaded_triples, loaded_chunks = 0, 0
+    started = time.time()
+
+    def collect(futures):
+        nonlocal loaded_triples, loaded_chunks
+        for fut in futures:
+            chunk, n_triples = pending.pop(fut)
+            fut.result()   # lỗi sau khi đã thử lại -> dừng, checkpoint giữ các chunk đã xong
+            done.add(chunk)
+            save_checkpoint(checkpoint, input_path, chunk_rows, done)
+            loaded_triples += n_triples
+            loaded_chunks += 1
+            elapsed = time.time() - started
+            print(f"[INFO] Chunk {chunk}: {n_triples} triples | tổng {loaded_triples} triples, "
+                  f"{loaded_triples / elapsed:,.0f} triples/s")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for chunk, df in enumerate(iter_chunks(input_path, chunk_rows)):
+                    if limit is not None and chunk * chunk_rows >= limit:
+                        break
+                    if limit is not None:
+                        df = df.head(limit - chunk * chunk_rows)
+                    if "Name" in df.columns and "IdCompany" in df.columns:
+                        named = df[["IdCompany", "Name"]].dropna()
+                        names.extend({"id": str(i), "name": str(n)} for i, n in named.itertuples(index=False))
+                    if chunk in done:
+                        continue
+
+                    body, n_triples = company_ntriples(df)
+                    # Giới hạn số lô đang gửi: không đọc trước quá xa so với tốc độ Fuseki nhận
+                    while len(pending) >= workers:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    pending[pool.submit(post_batch, endpoint, body, use_gzip)] = (chunk, n_triples)
+                collect(list(pending))
+            finally:
+                for fut in pending:
+                    fut.cancel()
+    finally:
+        if loaded_chunks:
+            # Kết quả SPARQL đã cache của dataset này (ở mọi process) không còn đúng, kể cả khi dừng giữa chừng
+            invalidate_dataset(endpoint)
+
+    elapsed = time.time() - started
+    print(f"✅ Đã nạp {loaded_chunks} chunk, {loaded_triples} triples trong {elapsed:.1f}s "
+          f"({loaded_triples / max(elapsed, 1e-9):,.0f} triples/s)")
+    if names:
+        total = update_company_names(names)
+        print(f"✅ Gazetteer: {total} tên công ty")
+    return loaded_triples
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--input", default="../data_excel/DoanhNghiepHCM.xlsx", help=".xlsx hoặc .csv")
+    p.add_argument("--endpoint", default=FUSEKI_DATA_URL)
+    p.add_argument("--chunk-rows", type=int, default=5000)
+    p.add_argument("--workers", type=int, default=4, help="số lô POST đồng thời")
+    p.add_argument("--checkpoint", default=None, help="mặc định: <input>.checkpoint.json")
+    p.add_argument("--no-gzip", action="store_true", help="gửi N-Triples không nén")
+    p.add_argument("--limit", type=int, default=None, help="chỉ nạp N dòng đầu")
+    args = p.parse_args()
+
+    bulk_load(args.input, args.endpoint, args.chunk_rows, args.workers, args.checkpoint,
+              use_gzip=not args.no_gzip, limit=args.limit)
@@ -0,0 +1,67 @@
+import sys
+import time
+import argparse
+import numpy as np
+from services.embedding_backends import BACKENDS, normalize_rows
+from services.embedding_service import DEFAULT_MODEL, EmbeddingService
+from services.segment_store import SegmentStore
+
+SEGMENT_DIR = "data/segments"
+EMBED_FILE = "data/pdf_embeddings.npz"
+
+# Chạy từ thư mục v5:  python -m scripts.check_embedding_parity --backend onnx_int8
+# So sánh embedding của 1 backend với backend tham chiếu trên các chunk đang index:
+# cosine giữa 2 vector của cùng 1 câu, mức trùng top-k khi search, và tốc độ encode.
+p = argparse.ArgumentParser()
+p.add_argument("--backend", choices=BACKENDS, default="onnx_int8")
+p.add_argument("--reference", choices=BACKENDS, default="sentence_transformers")
+p.add_argument("--model", default=DEFAULT_MODEL)
+p.add_argument("--texts-file", default=None, help="mỗi dòng 1 câu (mặc định: lấy chunk trong SegmentStore)")
+p.add_argument("--samples", type=int, default=1000)
+p.add_argument("--top-k", type=int, default=5)
+p.add_argument("--min-cosine", type=float, default=0.99, help="thoát mã 1 nếu cosine nhỏ nhất thấp hơn")
+args = p.parse_args()
+
+if args.texts_file:
+    with open(args.texts_file, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+else:
+    _, _, texts = SegmentStore(SEGMENT_DIR, legacy_file=EMBED_FILE).load_all()
+    texts = [str(t) for t in texts]
+if not texts:
+    sys.exit("[ERROR] Không có câu nào để so sánh")
+
+rng = np.random.default_rng(0)
+if len(texts) > args.samples:
+    texts = [texts[i] for i in rng.choice(len(texts), args.samples, replace=False)]
+
+
+def run(backend):
+    service = EmbeddingService(args.model, backend=backend)
+    service.warmup()
+    start = time.perf_counter()
+    vecs = normalize_rows(service.encode(texts))
+    return vecs, time.perf_counter() - start
+
+
+ref, ref_time = run(args.reference)
+cand, cand_time = run(args.backend)
+
+cosine = np.sum(ref * cand, axis=1)
+k = min(args.top_k, len(texts))
+# Mỗi câu làm query trên chính tập mẫu: top-k của 2 backend trùng bao nhiêu
+ref_top = np.argsort(-(ref @ ref.T), axis=1)[:, :k]
+cand_top = np.argsort(-(cand @ cand.T), axis=1)[:, :k]
+overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)])
+
+print(f"{len(texts)} câu | {args.reference} -> {args.backend}")
+print(f"  cosine   mean={cosine.mean():.5f}  p01={np.percentile(cosine, 1):.5f}  min={cosine.min():.5f}")
+print(f"  drift    max(1 - cosine)={1 - cosine.min():.5f}")
+print(f"  top-{k}    overlap={overlap:.4f}")
+print(f"  encode   {args.reference}={ref_time:.2f}s  {args.backend}={cand_time:.2f}s  "
+      f"(x{ref_time / max(cand_time, 1e-9):.2f})")
+
+if cosine.min() < args.min_cosine:
+    print(f"❌ cosine nhỏ nhất < {args.min_cosine}")
+    sys.exit(1)
+print("✅ Đạt ngưỡng parity")
@@ -0,0 +1,100 @@
+import sys
+import time
+import json
+import argparse
+import pandas as pd
+from rdflib import Graph, Namespace, Literal, RDF, XSD, URIRef
+from scripts.bulk_load_fuseki import COLUMNS, COMPANY_IRI_BASE, company_ntriples, iter_chunks
+
+SAMPLE_TTL = "scripts/companies_sample.ttl"
+
+# Chạy từ thư mục v5:  python -m scripts.check_rdf_parity [--input file.xlsx|file.csv] [--json records.json]
+# So sánh N-Triples sinh theo cột (services/nt_writer.py) với đường rdflib cũ (Graph + serialize nt):
+# từng dòng phải giống hệt nhau về byte (chỉ thứ tự dòng khác, vì Graph không có thứ tự).
+p = argparse.ArgumentParser()
+p.add_argument("--input", default=None, help="Excel / CSV công ty (mặc định: dựng lại bảng từ companies_sample.ttl)")
+p.add_argument("--rows", type=int, default=10000)
+p.add_argument("--json", default=None, help="records JSON cho parse_to_rdf.generate_ntriples (mapping.json)")
+args = p.parse_args()
+
+EX = Namespace("http://example.com/company#")
+
+
+def sample_table():
+    """Bảng cột Excel dựng lại từ file mẫu do rdflib sinh ra."""
+    g = Graph().parse(SAMPLE_TTL, format="turtle")
+    rows = {}
+    for s, p_, o in g:
+        if str(s).startswith(COMPANY_IRI_BASE):
+            row = rows.setdefault(s, {"IdCompany": str(s)[len(COMPANY_IRI_BASE):]})
+            for column, prop in COLUMNS.items():
+                if p_ == EX[prop] and column != "IdCompany":
+                    row[column] = str(o)
+    return pd.DataFrame(list(rows.values()), columns=list(COLUMNS))
+
+
+def rdflib_company_nt(df):
+    # Giống scripts/import_excel_to_fuseki.py trước khi chuyển sang ghép theo cột
+    g = Graph()
+    for _, row in df.iterrows():
+        company_uri = URIRef(f"{COMPANY_IRI_BASE}{row['IdCompany']}")
+        g.add((company_uri, RDF.type, EX.Company))
+        for column, prop in COLUMNS.items():
+            if pd.notna(row[column]):
+                g.add((company_uri, EX[prop], Literal(str(row[column]), datatype=XSD.string)))
+    return g.serialize(format="nt", encoding="utf-8")
+
+
+def compare(label, reference: bytes, candidate: bytes, ref_time, cand_time):
+    ref_lines = sorted(reference.splitlines())
+    cand_lines = sorted(candidate.splitlines())
+    print(f"{label}: {len(ref_lines)} triples (rdflib) / {len(cand_lines)} triples (theo cột)")
+    print(f"  thời gian  rdflib={ref_time:.3f}s  theo cột={cand_time:.3f}s  (x{ref_time / max(cand_time, 1e-9):.1f})")
+    if ref_lines == cand_lines:
+        return True
+    ref_set, cand_set = set(ref_lines), set(cand_lines)
+    for line in sorted(ref_set - cand_set)[:3]:
+        print(f"  - chỉ có ở rdflib:   {line[:200]!r}")
+    for line in sorted(cand_set - ref_set)[:3]:
+        print(f"  + chỉ có ở theo cột: {line[:200]!r}")
+    return False
+
+
+ok = True
+
+if args.input:
+    df = next(iter_chunks(args.input, args.rows))
+else:
+    df = sample_table()
+df = df[df["IdCompany"].notna()]
+
+start = time.perf_counter()
+reference = rdflib_company_nt(df)
+ref_time = time.perf_counter() - start
+start = time.perf_counter()
+candidate = company_ntriples(df)[0].encode("utf-8")
+cand_time = time.perf_counter() - start
+ok &= compare("Công ty (Excel)", reference, candidate, ref_time, cand_time)
+
+if args.json:
+    import os
+    import tempfile
+    from parse_to_rdf import generate_rdf, generate_ntriples
+    with open(args.json, encoding="utf-8") as f:
+        records = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        g = generate_rdf(records, "Company", os.path.join(tmp, "ref.ttl"))
+        reference = g.serialize(format="nt", encoding="utf-8")
+        ref_time = time.perf_counter() - start
+        start = time.perf_counter()
+        generate_ntriples(records, "Company", os.path.join(tmp, "out.nt"))
+        cand_time = time.perf_counter() - start
+        with open(os.path.join(tmp, "out.nt"), "rb") as f:
+            candidate = f.read()
+    ok &= compare("parse_to_rdf (JSON)", reference, candidate, ref_time, cand_time)
+
+if not ok:
+    print("❌ N-Triples khác đường rdflib")
+    sys.exit(1)
+print("✅ N-Triples giống hệt đường rdflib")
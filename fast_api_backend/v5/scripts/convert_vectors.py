@@ -0,0 +1,20 @@
+import argparse
+from services.segment_store import SegmentStore
+from services.vector_storage import VECTOR_DTYPES
+
+SEGMENT_DIR = "data/segments"
+EMBED_FILE = "data/pdf_embeddings.npz"
+
+# Chạy từ thư mục v5:  python -m scripts.convert_vectors --format int8
+# Ghi lại segment legacy (pdf_embeddings.npz) + gộp segment nhỏ theo định dạng memmap.
+# Sau đó chạy server với VECTOR_FORMAT cùng giá trị.
+p = argparse.ArgumentParser()
+p.add_argument("--format", choices=VECTOR_DTYPES, default="float16")
+args = p.parse_args()
+
+store = SegmentStore(SEGMENT_DIR, legacy_file=EMBED_FILE, vector_format=args.format)
+store.migrate_legacy()
+store.compact()
+
+for seg in store.manifest()["segments"]:
+    print(f"{seg['name']:>12} {seg.get('format', 'npz'):>8} {seg['count']:>8} dòng")
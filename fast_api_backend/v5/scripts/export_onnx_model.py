@@ -0,0 +1,15 @@
+import argparse
+from services.embedding_backends import ONNX_DIR, export_onnx
+from services.embedding_service import DEFAULT_MODEL
+
+# Chạy từ thư mục v5:  python -m scripts.export_onnx_model
+# Export model embedding sang ONNX (+ int8) để dùng EMBEDDING_BACKEND=onnx / onnx_int8.
+# Sau đó kiểm tra độ lệch bằng scripts.check_embedding_parity trước khi đổi backend.
+p = argparse.ArgumentParser()
+p.add_argument("--model", default=DEFAULT_MODEL)
+p.add_argument("--onnx-dir", default=ONNX_DIR)
+p.add_argument("--no-quantize", action="store_true")
+args = p.parse_args()
+
+out_dir = export_onnx(args.model, args.onnx_dir, quantize=not args.no_quantize)
+print(f"✅ Đã export {args.model} -> {out_dir}")
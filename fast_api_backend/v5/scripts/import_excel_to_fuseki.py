@@ -1,11 +1,17 @@
+import os
+import sys
 import pandas as pd
-from rdflib import Graph, Namespace, Literal, RDF, XSD, URIRef
 import requests
 
+# Cho phép import services/* khi chạy trực tiếp từ thư mục scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from services.company_gazetteer import update_company_names
+from services.sparql_cache import invalidate_dataset
+from scripts.bulk_load_fuseki import company_ntriples
+
 # ========================
 # CONFIG
 # ========================
-EX = Namespace("http://example.com/company#")
 FUSEKI_DATA_URL = "http://localhost:3030/companies/data"  # endpoint /data
 EXCEL_PATH = "../data_excel/DoanhNghiepHCM.xlsx"
 N_ROWS = 10 # số dòng đầu tiên để import
@@ -17,34 +23,24 @@ df = pd.read_excel(EXCEL_PATH)
 df = df.head(N_ROWS)
 
 # ========================
-# BUILD RDF GRAPH
+# BUILD N-TRIPLES (ghép theo cột, không dựng rdflib Graph)
 # ========================
-g = Graph()
-g.bind("ex", EX)
-
-for _, row in df.iterrows():
-    company_uri = URIRef(f"http://example.com/company/{row['IdCompany']}")
-    g.add((company_uri, RDF.type, EX.Company))
-
-    def add_prop(predicate, value):
-        if pd.notna(value):
-            g.add((company_uri, predicate, Literal(str(value), datatype=XSD.string)))
-
-    add_prop(EX.idCompany, row["IdCompany"])
-    add_prop(EX.name, row["Name"])
-    add_prop(EX.latestLegalRegistration, row["LatestLegalRegistration"])
-    add_prop(EX.type, row["Type"])
-    add_prop(EX.address, row["Address"])
-    add_prop(EX.business, row["Business"])
-
-ttl_data = g.serialize(format="turtle")
+nt_data, n_triples = company_ntriples(df)
 
-headers = {"Content-Type": "text/turtle"}
+headers = {"Content-Type": "application/n-triples"}
 
 try:
-    response = requests.post(FUSEKI_DATA_URL, data=ttl_data.encode("utf-8"), headers=headers)
+    response = requests.post(FUSEKI_DATA_URL, data=nt_data.encode("utf-8"), headers=headers)
     if response.status_code in [200, 201, 204]:
-        print("✅ Dữ liệu RDF đã được nạp thành công vào Fuseki!")
+        print(f"✅ Dữ liệu RDF ({n_triples} triples) đã được nạp thành công vào Fuseki!")
+        # Kết quả SPARQL đã cache của dataset này (ở mọi process) không còn đúng
+        invalidate_dataset(FUSEKI_DATA_URL)
+        # Cập nhật file tên công ty -> server tự build lại gazetteer
+        names = df[["IdCompany", "Name"]].dropna(subset=["Name"])
+        total = update_company_names(
+            {"id": str(r.IdCompany), "name": str(r.Name)} for r in names.itertuples(index=False)
+        )
+        print(f"✅ Gazetteer: {total} tên công ty")
     else:
         print(f"❌ Lỗi khi nạp dữ liệu: {response.status_code}\n{response.text}")
 except Exception as e:
@@ -1,34 +1,20 @@
+import os
+import sys
 import pandas as pd
-from rdflib import Graph, Namespace, Literal, RDF, XSD, URIRef
 
-# ===== Khai báo namespace =====
-EX = Namespace("http://example.com/company#")
+# Cho phép import services/* khi chạy trực tiếp từ thư mục scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from services.nt_writer import write_ntriples
+from scripts.bulk_load_fuseki import company_ntriples
 
 # ===== Đọc file Excel =====
 df = pd.read_excel("../data_excel/DoanhNghiepHCM.xlsx")  # đổi tên nếu cần
 df = df.head(11)  # lấy 11 dòng đầu (dòng 1 là tiêu đề)
 
-# ===== Tạo graph RDF =====
-g = Graph()
-g.bind("ex", EX)
+# ===== Tạo RDF theo cột (N-Triples, không dựng rdflib Graph) =====
+nt_data, n_triples = company_ntriples(df)
 
-for _, row in df.iterrows():
-    company_uri = URIRef(f"http://example.com/company/{row['IdCompany']}")
-    g.add((company_uri, RDF.type, EX.Company))
-
-    if not pd.isna(row["IdCompany"]):
-        g.add((company_uri, EX.idCompany, Literal(str(row["IdCompany"]), datatype=XSD.string)))
-    if not pd.isna(row["Name"]):
-        g.add((company_uri, EX.name, Literal(row["Name"], datatype=XSD.string)))
-    if not pd.isna(row["LatestLegalRegistration"]):
-        g.add((company_uri, EX.latestLegalRegistration, Literal(str(row["LatestLegalRegistration"]), datatype=XSD.string)))
-    if not pd.isna(row["Type"]):
-        g.add((company_uri, EX.type, Literal(row["Type"], datatype=XSD.string)))
-    if not pd.isna(row["Address"]):
-        g.add((company_uri, EX.address, Literal(row["Address"], datatype=XSD.string)))
-    if not pd.isna(row["Business"]):
-        g.add((company_uri, EX.business, Literal(row["Business"], datatype=XSD.string)))
-
-# ===== Xuất file RDF/Turtle =====
-g.serialize(destination="companies_sample.ttl", format="turtle")
-print("✅ Exported 10 companies → companies_sample.ttl")
+# ===== Xuất file RDF (N-Triples cũng là Turtle hợp lệ) =====
+with open("companies_sample.ttl", "wb") as f:
+    write_ntriples(nt_data, f)
+print(f"✅ Exported {len(df)} companies ({n_triples} triples) → companies_sample.ttl")
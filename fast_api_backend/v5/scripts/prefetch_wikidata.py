@@ -0,0 +1,20 @@
+import argparse
+from services.company_gazetteer import GAZETTEER_FILE, load_company_names
+from services.wikidata_cache import WikidataCache, WIKIDATA_CACHE_FILE, WIKIDATA_SPARQL_URL
+
+# Chạy từ thư mục v5:  python -m scripts.prefetch_wikidata
+# Nạp trước cache Wikidata (SQLite) cho mọi tên trong file tên công ty, mỗi query VALUES
+# tra nhiều tên một lúc; sau đó server có thể chạy với WIKIDATA_OFFLINE=1.
+p = argparse.ArgumentParser()
+p.add_argument("--names", default=GAZETTEER_FILE, help="file tên công ty (scripts.build_company_gazetteer)")
+p.add_argument("--cache", default=WIKIDATA_CACHE_FILE)
+p.add_argument("--endpoint", default=WIKIDATA_SPARQL_URL)
+p.add_argument("--batch-size", type=int, default=None)
+args = p.parse_args()
+
+cache = WikidataCache(args.cache, endpoint=args.endpoint, offline=False)
+if args.batch_size:
+    cache.batch_size = args.batch_size
+names = [r["name"] for r in load_company_names(args.names) if r.get("name")]
+found = cache.prefetch(names)
+print(f"✅ Wikidata: {found}/{len(names)} tên có kết quả, cache {cache.stats()}")
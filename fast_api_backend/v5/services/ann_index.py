@@ -0,0 +1,142 @@
+import os
+import json
+import numpy as np
+from services.vector_index import normalize_rows
+
+# ------------------ Cấu hình mặc định ------------------
+ANN_TYPES = ("hnsw", "ivf")
+
+DEFAULT_HNSW_M = 32             # số cạnh mỗi node, tăng -> recall cao hơn, tốn RAM hơn
+DEFAULT_EF_CONSTRUCTION = 200   # độ rộng tìm kiếm khi build
+DEFAULT_EF_SEARCH = 64          # độ rộng tìm kiếm khi query (recall <-> tốc độ)
+DEFAULT_NPROBE = 16             # số cluster IVF được quét mỗi query
+
+
+def ann_paths(embed_file, index_type):
+    """Đường dẫn file index + file tham số, đặt cạnh file npz."""
+    base = os.path.splitext(embed_file)[0]
+    return f"{base}.{index_type}.faiss", f"{base}.{index_type}.json"
+
+
+class AnnIndex:
+    """
+    Index gần đúng (HNSW hoặc IVF) trên embedding đã chuẩn hoá, dùng inner product
+    = cosine similarity. Cùng interface search() với VectorIndex nên build_prompt
+    dùng được trực tiếp.
+    """
+
+    def __init__(self, faiss_index, metadata, texts=None, index_type="hnsw", params=None):
+        self.index = faiss_index
+        self.metadata = metadata
+        self.texts = texts
+        self.index_type = index_type
+        self.params = params or {}
+        self.set_search_params(**self.params)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    # ------------------ Build ------------------
+    @classmethod
+    def build(cls, chunk_vectors, metadata, texts=None, index_type="hnsw",
+              m=DEFAULT_HNSW_M, ef_construction=DEFAULT_EF_CONSTRUCTION,
+              ef_search=DEFAULT_EF_SEARCH, nlist=None, nprobe=DEFAULT_NPROBE):
+        import faiss
+
+        if index_type not in ANN_TYPES:
+            raise ValueError(f"index_type phải thuộc {ANN_TYPES}, nhận được: {index_type}")
+
+        matrix = normalize_rows(chunk_vectors)
+        dim = matrix.shape[1]
+
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ef_construction
+            params = {"m": m, "ef_construction": ef_construction, "ef_search": ef_search}
+        else:
+            # Heuristic quen thuộc: nlist ~ 4 * sqrt(N), không vượt quá số vector
+            nlist = nlist or max(1, min(len(matrix), int(4 * np.sqrt(len(matrix)))))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(matrix)
+            params = {"nlist": nlist, "nprobe": nprobe}
+
+        index.add(matrix)
+        return cls(index, metadata, texts, index_type, params)
+
+    def set_search_params(self, ef_search=None, nprobe=None, **_):
+        """Chỉnh trade-off recall/tốc độ lúc query mà không cần build lại."""
+        if self.index_type == "hnsw" and ef_search:
+            self.index.hnsw.efSearch = ef_search
+            self.params["ef_search"] = ef_search
+        if self.index_type == "ivf" and nprobe:
+            self.index.nprobe = nprobe
+            self.params["nprobe"] = nprobe
+
+    # ------------------ Lưu / nạp ------------------
+    def save(self, embed_file, fingerprint=None):
+        import faiss
+
+        index_path, params_path = ann_paths(embed_file, self.index_type)
+        faiss.write_index(self.index, index_path)
+        with open(params_path, "w", encoding="utf-8") as f:
+            json.dump({"index_type": self.index_type, "ntotal": len(self), "fingerprint": fingerprint,
+                       "params": self.params}, f)
+        return index_path
+
+    @classmethod
+    def load(cls, embed_file, metadata, texts=None, index_type="hnsw"):
+        import faiss
+
+        index_path, params_path = ann_paths(embed_file, index_type)
+        with open(params_path, encoding="utf-8") as f:
+            info = json.load(f)
+        index = faiss.read_index(index_path)
+        return cls(index, metadata, texts, index_type, info.get("params"))
+
+    # ------------------ Search ------------------
+    def row(self, i):
+        return self.metadata[i], self.texts[i] if self.texts is not None else None
+
+    def search(self, query_vec, top_k=3):
+        if len(self) == 0 or top_k <= 0:
+            return []
+
+        q = normalize_rows(query_vec)
+        scores, ids = self.index.search(q, min(top_k, len(self)))
+        return [
+            {
+                "id": int(i),
+                "score": float(s),
+                "metadata": self.metadata[i],
+                "text": self.texts[i] if self.texts is not None else None,
+            }
+            for s, i in zip(scores[0], ids[0])
+            if i >= 0
+        ]
+
+
+def load_or_build(embed_file, chunk_vectors, metadata, texts=None, index_type="hnsw", fingerprint=None, **params):
+    """
+    Nạp index đã lưu cạnh file npz; build lại (và lưu) nếu chưa có, số vector lệch,
+    hoặc fingerprint của dữ liệu (SegmentStore.fingerprint) khác lúc build — cùng số dòng
+    chưa chắc cùng dữ liệu (vd. xoá 1 PDF rồi upload PDF khác cùng số chunk).
+    chunk_vectors có thể là hàm trả về ma trận: chỉ được gọi khi thật sự phải build.
+    """
+    index_path, params_path = ann_paths(embed_file, index_type)
+    if os.path.exists(index_path) and os.path.exists(params_path):
+        with open(params_path, encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("ntotal") == len(metadata) and info.get("fingerprint") == fingerprint:
+            index = AnnIndex.load(embed_file, metadata, texts, index_type)
+            index.set_search_params(**params)
+            return index
+        print(f"[INFO] Index {index_type} không còn khớp dữ liệu "
+              f"({info.get('ntotal')} vector, fingerprint {info.get('fingerprint')}), build lại.")
+
+    if callable(chunk_vectors):
+        chunk_vectors = chunk_vectors()
+    index = AnnIndex.build(chunk_vectors, metadata, texts, index_type, **params)
+    index.save(embed_file, fingerprint)
+    print(f"[INFO] Đã build index {index_type}: {len(index)} vector -> {index_path}")
+    return index
@@ -0,0 +1,111 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAX_DISTANCE = 0.05   # khoảng cách cosine tối đa để coi 2 câu hỏi là một
+DEFAULT_TTL = 3600            # giây
+DEFAULT_MAX_ENTRIES = 512
+
+
+def context_key(context: str) -> str:
+    return hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo ngữ nghĩa: nếu câu hỏi mới có embedding đủ gần
+    (1 - cosine <= max_distance) với 1 câu đã trả lời VÀ context truy xuất được
+    giống hệt, phát lại chuỗi token đã lưu thay vì gọi lại LLM.
+
+    - Entry được nhóm theo hash của context nên chỉ so sánh vector với các câu
+      hỏi có cùng context.
+    - Giới hạn theo TTL và số entry (LRU).
+    - invalidate() xoá toàn bộ và tăng generation; câu trả lời bắt đầu sinh
+      trước khi invalidate sẽ không được lưu lại.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()   # id -> entry
+        self._by_context = {}           # context_key -> [id]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vec):
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_context.get(entry["context_key"], [])
+        if entry_id in ids:
+            ids.remove(entry_id)
+        if not ids:
+            self._by_context.pop(entry["context_key"], None)
+
+    def lookup(self, query_vec, context):
+        """Trả về list token đã lưu hoặc None."""
+        key = context_key(context)
+        q = self._unit(query_vec)
+        now = time.time()
+        with self._lock:
+            best_id, best_dist = None, None
+            for entry_id in list(self._by_context.get(key, [])):
+                entry = self._entries[entry_id]
+                if entry["expires"] < now:
+                    self._drop(entry_id)
+                    continue
+                dist = 1.0 - float(entry["vec"] @ q)
+                if dist <= self.max_distance and (best_dist is None or dist < best_dist):
+                    best_id, best_dist = entry_id, dist
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return list(self._entries[best_id]["tokens"])
+
+    def store(self, query_vec, context, tokens, generation=None):
+        if not tokens:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            key = context_key(context)
+            self._entries[entry_id] = {
+                "vec": self._unit(query_vec),
+                "context_key": key,
+                "tokens": tuple(tokens),
+                "expires": time.time() + self.ttl,
+            }
+            self._by_context.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *_):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "generation": self.generation,
+            }
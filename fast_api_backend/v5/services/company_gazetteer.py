@@ -0,0 +1,278 @@
+import os
+import json
+import threading
+from services.lexical_index import tokenize_vi, strip_accents
+
+# ------------------ Cấu hình ------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_FILE = os.path.normpath(
+    os.getenv("COMPANY_GAZETTEER_FILE", os.path.join(BASE_DIR, "../data/company_names.json"))
+)
+
+# Tiền tố loại hình doanh nghiệp: bỏ đi để tạo alias ngắn ("công ty tnhh tma solutions" -> "tma solutions")
+LEGAL_FORMS = [
+    "cong ty", "tap doan", "doanh nghiep tu nhan", "doanh nghiep", "chi nhanh", "van phong dai dien",
+    "trach nhiem huu han", "tnhh", "co phan", "cp", "mot thanh vien", "mtv", "hai thanh vien",
+    "thuong mai", "dich vu", "tm", "dv", "san xuat", "sx", "xuat nhap khau", "xnk", "hop danh",
+]
+_LEGAL_FORM_TOKENS = sorted((f.split() for f in LEGAL_FORMS), key=len, reverse=True)
+MIN_ALIAS_CHARS = 3
+
+# Từ / cụm phổ biến trong tên công ty lẫn câu hỏi thường ("việt nam", "tư vấn", "nhân sự"...):
+# alias rút gọn chỉ gồm các từ này không đủ phân biệt 1 công ty nên không được dùng
+COMMON_PHRASES = [
+    "viet nam", "vn", "thanh pho", "ho chi minh", "hcm", "sai gon", "ha noi", "mien nam", "mien bac",
+    "quoc te", "toan cau", "chau a", "dong duong", "tu van", "nhan su", "phan mem", "cong nghe",
+    "thong tin", "giai phap", "dau tu", "phat trien", "xay dung", "bat dong san", "ky thuat", "thiet bi",
+    "tai chinh", "ke toan", "kiem toan", "bao hiem", "ngan hang", "luat", "phap ly", "lao dong",
+    "chinh sach", "giao duc", "dao tao", "y te", "du lich", "van tai", "logistics", "thuc pham",
+    "nong nghiep", "moi truong", "truyen thong", "quang cao", "xuat khau", "nhap khau", "kinh doanh",
+    "san pham", "hang hoa", "vat lieu", "dien tu", "nang luong", "co khi", "noi that", "thoi trang",
+    "my pham", "duoc pham", "an uong", "nha hang", "khach san", "bao ve", "ve sinh", "in an",
+    "viet", "nam", "a", "b", "c", "1", "2", "3", "moi", "xanh", "vang", "sao", "ngoi sao", "hoang gia",
+    "quan", "phuong", "huyen", "tinh", "so", "va", "cua", "the", "and", "group", "co", "ltd", "jsc",
+]
+_COMMON_TOKENS = {t for phrase in COMMON_PHRASES + LEGAL_FORMS for t in phrase.split()}
+# Dấu hiệu câu hỏi đang nói về 1 doanh nghiệp (đã bỏ dấu, chữ thường)
+COMPANY_CUES = ["cong ty", "cty", "doanh nghiep", "tap doan", "tnhh", "co phan", "mst", "ma so thue",
+                "ma doanh nghiep", "chi nhanh"]
+
+
+def normalize_tokens(text: str):
+    """Token chữ thường, bỏ dấu: so khớp được cả câu hỏi gõ không dấu."""
+    return tokenize_vi(strip_accents(text or ""))
+
+
+def strip_legal_forms(tokens):
+    """Bỏ các tiền tố loại hình doanh nghiệp khỏi đầu chuỗi token đã chuẩn hoá."""
+    core, changed = list(tokens), True
+    while changed and core:
+        changed = False
+        for form in _LEGAL_FORM_TOKENS:
+            if core[:len(form)] == form:
+                core, changed = core[len(form):], True
+                break
+    return core
+
+
+def is_distinctive(tokens) -> bool:
+    """Alias rút gọn phải >= 2 token và có ít nhất 1 token không phải từ phổ biến."""
+    return (
+        len(tokens) >= 2
+        and len(" ".join(tokens)) >= MIN_ALIAS_CHARS
+        and not all(t.isdigit() or t in _COMMON_TOKENS for t in tokens)
+    )
+
+
+def name_aliases(name: str):
+    """
+    Các dạng token của 1 tên công ty: [(token, là tên đầy đủ?)].
+    Tên đầy đủ luôn có; tên đã bỏ tiền tố loại hình chỉ có khi đủ phân biệt (is_distinctive).
+    """
+    tokens = normalize_tokens(name)
+    aliases = [(tuple(tokens), True)] if tokens else []
+    core = strip_legal_forms(tokens)
+    if core != tokens and is_distinctive(core):
+        aliases.append((tuple(core), False))
+    return aliases
+
+
+def has_company_cue(text: str) -> bool:
+    padded = f" {' '.join(normalize_tokens(text))} "
+    return any(f" {cue} " in padded for cue in COMPANY_CUES)
+
+
+class CompanyGazetteer:
+    """
+    Automaton Aho-Corasick trên chuỗi token của tên công ty + alias.
+    find() quét câu hỏi 1 lượt (O(số token)) và trả về các công ty xuất hiện trong câu,
+    ưu tiên match dài nhất. Khớp theo ranh giới từ vì automaton chạy trên token.
+    """
+
+    def __init__(self):
+        self._goto = [{}]       # node -> {token: node}
+        self._fail = [0]
+        self._out = [[]]        # node -> [(số token, id, tên, là tên đầy đủ?)] kết thúc đúng tại node
+        self._out_link = [0]    # node gần nhất trên chuỗi fail có output (0 = không có)
+        self.size = 0
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        records: iterable {"id", "name"}. Alias rút gọn trùng giữa nhiều công ty
+        (vd. "an phat" của 10 công ty khác nhau) bị bỏ, chỉ giữ tên đầy đủ.
+        """
+        gazetteer = cls()
+        short = {}   # alias -> {khoá công ty: (id, tên)}
+        for rec in records:
+            for alias, full in name_aliases(rec.get("name") or ""):
+                if full:
+                    gazetteer._add(alias, rec.get("id"), rec["name"], True)
+                else:
+                    short.setdefault(alias, {})[rec.get("id") or rec["name"]] = (rec.get("id"), rec["name"])
+        for alias, owners in short.items():
+            if len(owners) == 1:
+                company_id, name = next(iter(owners.values()))
+                gazetteer._add(alias, company_id, name, False)
+        gazetteer._build_links()
+        return gazetteer
+
+    def _add(self, tokens, company_id, name, full):
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._out_link.append(0)
+            node = nxt
+        self._out[node].append((len(tokens), company_id, name, full))
+        self.size += 1
+
+    def _build_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and token not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(token, 0)
+                target = target if target != child else 0
+                self._fail[child] = target
+                self._out_link[child] = target if self._out[target] else self._out_link[target]
+
+    def find(self, text: str):
+        """[{id, name, tokens, full}] theo độ dài match giảm dần, mỗi công ty 1 lần (full: khớp tên đầy đủ)."""
+        node, found = 0, {}
+        for token in normalize_tokens(text):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            match = node if self._out[node] else self._out_link[node]
+            while match:
+                for length, company_id, name, full in self._out[match]:
+                    key = company_id or name
+                    if key not in found or found[key]["tokens"] < length:
+                        found[key] = {"id": company_id, "name": name, "tokens": length, "full": full}
+                match = self._out_link[match]
+        return sorted(found.values(), key=lambda m: m["tokens"], reverse=True)
+
+
+# ------------------ File tên công ty (ghi bởi script import) ------------------
+def load_company_names(path=GAZETTEER_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_company_names(records, path=GAZETTEER_FILE):
+    """Gộp records {"id", "name", "iri"?} vào file (theo id) và ghi atomic. Trả về số tên trong file."""
+    merged = {str(r.get("id") or r["name"]): r for r in load_company_names(path)}
+    for rec in records:
+        if rec.get("name"):
+            entry = {"id": rec.get("id"), "name": str(rec["name"])}
+            if rec.get("iri"):
+                entry["iri"] = rec["iri"]
+            merged[str(rec.get("id") or rec["name"])] = entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(list(merged.values()), f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return len(merged)
+
+
+# ------------------ Instance dùng chung ------------------
+class NamesFileResource:
+    """
+    Cấu trúc dữ liệu build từ file tên công ty (gazetteer, index trigram...).
+    Khi file đổi (sau mỗi lần import) thì build lại trong thread nền, trong lúc đó
+    get() vẫn trả về bản cũ. Lần đầu: get() build đồng bộ, get(wait=False) (gọi từ
+    event loop) trả về None ngay và build trong thread nền.
+    """
+
+    def __init__(self, build, label, path=GAZETTEER_FILE):
+        self.build = build
+        self.label = label
+        self.path = path
+        self._value = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return None
+
+    def _build_now(self):
+        # Gọi khi giữ _build_lock
+        mtime = self._file_mtime()
+        if self._value is not None and mtime == self._mtime:
+            return   # thread khác vừa build xong
+        records = load_company_names(self.path)
+        value = self.build(records)
+        self._value, self._mtime = value, mtime
+        print(f"[INFO] {self.label}: {len(records)} tên công ty")
+
+    def _rebuild(self):
+        try:
+            with self._build_lock:
+                self._build_now()
+        except Exception as e:
+            print(f"[ERROR] {self.label}: build lỗi:", e)
+        finally:
+            self._rebuilding = False
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="names-rebuild", daemon=True).start()
+
+    def get(self, wait=True):
+        if self._value is None:
+            if not wait:
+                self._start_rebuild()
+                return None
+            with self._build_lock:
+                if self._value is None:
+                    self._build_now()
+            return self._value
+
+        if self._file_mtime() != self._mtime and not self._rebuilding:
+            self._start_rebuild()
+        return self._value
+
+
+_gazetteer = NamesFileResource(CompanyGazetteer.from_records, "Gazetteer công ty")
+
+
+def get_gazetteer(wait=True):
+    return _gazetteer.get(wait)
+
+
+def find_companies(question: str, wait=True):
+    """
+    Công ty được nhắc tới trong câu hỏi. Khớp tên đầy đủ luôn được tin; khớp alias rút gọn
+    chỉ được tin khi câu hỏi có dấu hiệu doanh nghiệp ("công ty", "MST"...).
+    wait=False (event loop): gazetteer chưa build xong -> [] thay vì chặn loop.
+    """
+    gazetteer = get_gazetteer(wait)
+    if gazetteer is None:
+        return []
+    matches = gazetteer.find(question)
+    if matches and not all(m["full"] for m in matches) and not has_company_cue(question):
+        matches = [m for m in matches if m["full"]]
+    return matches
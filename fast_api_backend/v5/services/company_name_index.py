@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+import numpy as np
+from services.lexical_index import strip_accents
+from services.company_gazetteer import NamesFileResource, strip_legal_forms
+
+# Dùng chung chuẩn hoá tên công ty với pipeline ingest (models/v2/ingest_opendata_hcm.py)
+V2_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../models/v2"))
+sys.path.append(V2_DIR)
+from ingest_opendata_hcm import normalize_company_name
+
+# ------------------ Cấu hình ------------------
+COMPANY_IRI_BASE = "http://example.com/company/"   # giống URI trong scripts/import_excel_to_fuseki.py
+FUZZY_MIN_SCORE = float(os.getenv("COMPANY_FUZZY_MIN_SCORE", "0.5"))
+STOP_TRIGRAM_RATIO = 0.05   # trigram có trong > 5% tên không dùng để tìm ứng viên
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def fold_name(name: str) -> str:
+    """normalize_company_name -> bỏ dấu, chữ thường -> bỏ tiền tố loại hình doanh nghiệp."""
+    folded = _NON_ALNUM.sub(" ", strip_accents(normalize_company_name(name)).lower())
+    core = strip_legal_forms(folded.split())
+    return " ".join(core or folded.split())
+
+
+def trigrams(text: str):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyNameIndex:
+    """
+    Index trigram ký tự trên tên công ty đã chuẩn hoá (bỏ dấu, bỏ "công ty TNHH"...).
+    resolve() trả về công ty có hệ số Dice trigram cao nhất cùng IRI của nó, để
+    Fuseki chỉ phải tra trực tiếp theo IRI thay vì quét FILTER(CONTAINS(...)).
+    Posting lưu dạng CSR (offsets + ids numpy); trigram quá phổ biến bị bỏ qua.
+    """
+
+    def __init__(self, records):
+        self.records = [r for r in records if r.get("name") and (r.get("iri") or r.get("id"))]
+        grams = [trigrams(fold_name(r["name"])) for r in self.records]
+
+        vocab = {}
+        gram_ids, doc_ids = [], []
+        for doc, doc_grams in enumerate(grams):
+            for g in doc_grams:
+                gram_ids.append(vocab.setdefault(g, len(vocab)))
+                doc_ids.append(doc)
+        gram_ids = np.asarray(gram_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        order = np.argsort(gram_ids, kind="stable")
+        counts = np.bincount(gram_ids, minlength=len(vocab))
+
+        self.vocab = vocab
+        self.postings = doc_ids[order]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        # Trigram phổ biến (vd. "ng ", " ph") không phân biệt được công ty nào
+        max_df = max(1, int(STOP_TRIGRAM_RATIO * len(self.records)))
+        self.stop = counts > max(max_df, 50)
+        self.doc_sizes = np.bincount(
+            doc_ids[~self.stop[gram_ids]], minlength=len(self.records)
+        ).astype(np.float32)
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, name: str, top_k=5):
+        """[{id, iri, name, score}] theo điểm Dice giảm dần."""
+        grams = [self.vocab.get(g) for g in trigrams(fold_name(name))]
+        known = [g for g in grams if g is not None and not self.stop[g]]
+        q_size = sum(1 for g in grams if g is None or not self.stop[g])
+        if not known:
+            return []
+
+        hits = np.concatenate([self.postings[self.offsets[g]:self.offsets[g + 1]] for g in known])
+        docs, shared = np.unique(hits, return_counts=True)
+        scores = 2.0 * shared / (q_size + self.doc_sizes[docs])
+        k = min(top_k, len(docs))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(docs) else np.arange(len(docs))
+        top = top[np.argsort(-scores[top])]
+        return [self._result(int(docs[i]), float(scores[i])) for i in top]
+
+    def _result(self, doc, score):
+        rec = self.records[doc]
+        iri = rec.get("iri") or f"{COMPANY_IRI_BASE}{rec['id']}"
+        return {"id": rec.get("id"), "iri": iri, "name": rec["name"], "score": round(score, 4)}
+
+    def resolve(self, name: str, min_score=FUZZY_MIN_SCORE):
+        """Công ty khớp nhất (score >= min_score) hoặc None."""
+        results = self.search(name, top_k=1)
+        return results[0] if results and results[0]["score"] >= min_score else None
+
+
+_name_index = NamesFileResource(CompanyNameIndex, "Index trigram tên công ty")
+
+
+def get_name_index(wait=True):
+    return _name_index.get(wait)
+
+
+def resolve_company(name: str):
+    return get_name_index().resolve(name)
@@ -1,66 +1,173 @@
-import numpy as np
-import requests
-from services.question_service import analyze_question, fetch_company_info
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from services.wikidata_cache import get_wikidata_cache
+from services.question_service import analyze_question_async, fetch_company_info_async
+from services.llm_client import OllamaClient
+from services.lexical_index import HybridIndex
+from services.company_gazetteer import find_companies
 
-def cosine_similarity(vec1, vec2):
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+LEXICAL_MIN_COVERAGE = 0.8   # chunk chứa >= 80% (theo idf) từ khoá của câu hỏi cũng được coi là liên quan
 
 def query_wikidata(entity_label):
-    query = f"""
-    SELECT ?item ?itemLabel ?description WHERE {{
-      ?item rdfs:label "{entity_label}"@en.
-      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-    }} LIMIT 5
-    """
-    r = requests.get("https://query.wikidata.org/sparql",
-                     params={"query": query},
-                     headers={"Accept": "application/sparql-results+json"})
-    data = r.json()
-    results = []
-    for item in data["results"]["bindings"]:
-        results.append({
-            "label": item.get("itemLabel", {}).get("value"),
-            "description": item.get("description", {}).get("value")
-        })
-    return results
-
-
-def build_prompt(question: str, embeddings_model, chunk_vectors, metadata, similarity_threshold=0.6):
-    query_vec = embeddings_model.encode(question)
-    best_text, max_sim = "", 0.0
-
-    if len(chunk_vectors) > 0:
-        sims = [cosine_similarity(query_vec, c) for c in chunk_vectors]
-        idx = int(np.argmax(sims))
-        max_sim = sims[idx]
-        best_text = metadata[idx].get("text_preview", "")
-
-    context_parts = []
-
-    if max_sim >= similarity_threshold and best_text:
-        context_parts.append(best_text)
+    """[{label, description}] của các thực thể Wikidata có nhãn entity_label (qua cache SQLite)."""
+    return get_wikidata_cache().lookup([entity_label]).get(entity_label, [])
+
+
+# ------------------ Thu thập context song song ------------------
+# Mỗi nguồn có hạn chót riêng (giây, tính từ lúc bắt đầu); nguồn quá hạn bị huỷ, không giữ tài nguyên
+SOURCE_DEADLINES = {
+    "documents": float(os.getenv("CONTEXT_DEADLINE_DOCUMENTS", "2.0")),   # encode + search chunk PDF
+    "company": float(os.getenv("CONTEXT_DEADLINE_COMPANY", "4.0")),       # tên công ty (gazetteer/LLM) + Fuseki
+    "lod": float(os.getenv("CONTEXT_DEADLINE_LOD", "1.5")),               # Wikidata
+}
+# Encode câu hỏi chờ MicroBatcher trên event loop (không giữ thread, batch gom được mọi request
+# đang chờ); chỉ phần search index (CPU) chạy trong pool. Việc còn xếp hàng khi quá hạn bị huỷ.
+_document_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CONTEXT_DOCUMENT_WORKERS", "8")),
+                                    thread_name_prefix="context-docs")
+
+
+async def _encode_question(embeddings_model, question):
+    if hasattr(embeddings_model, "encode_async"):
+        return await embeddings_model.encode_async(question)
+    return await asyncio.get_running_loop().run_in_executor(_document_pool, embeddings_model.encode, question)
+
+
+async def _search_documents(question, embeddings_model, index, similarity_threshold, top_k, lexical_threshold):
+    query_vec = await _encode_question(embeddings_model, question)
+    relevant = await asyncio.get_running_loop().run_in_executor(
+        _document_pool, _search_index, index, query_vec, question, similarity_threshold, top_k, lexical_threshold,
+    )
+    return query_vec, relevant
+
+
+def _search_index(index, query_vec, question, similarity_threshold, top_k, lexical_threshold):
+    if isinstance(index, HybridIndex):
+        hits = index.search(query_vec, top_k, query_text=question)
     else:
-        is_related, company_name = analyze_question(question)
-        company_info, _ = fetch_company_info(company_name) if is_related else (None, None)
-
-        lod_text = ""
-        # lod_results = query_wikidata(company_name or question)
-        # for item in lod_results:
-        #     label = item.get("label", "Unknown")
-        #     desc = item.get("description", "")
-        #     lod_text += f"{label}: {desc}\n"
-
-        if company_info:
-            context_parts.append(
-                f"Company Information:\n"
-                f"Name: {company_info.get('name', '')}\n"
-                f"Type: {company_info.get('type', '')}\n"
-                f"Address: {company_info.get('address', '')}\n"
-                f"Business: {company_info.get('business', '')}\n"
-                f"Established: {company_info.get('latestLegalRegistration', '')}"
-            )
-        if lod_text:
-            context_parts.append(f"LOD supplement:\n{lod_text}")
-
-    context = "\n\n".join(context_parts)
+        hits = index.search(query_vec, top_k)
+    # Chunk đã giới hạn số token nên đưa nguyên văn vào context (dữ liệu cũ không có text -> dùng preview)
+    relevant = [
+        h.get("text") or h["metadata"].get("text_preview", "")
+        for h in hits
+        if (h["score"] >= similarity_threshold or h.get("lexical", 0.0) >= lexical_threshold)
+        and (h.get("text") or h["metadata"].get("text_preview"))
+    ]
+    return relevant
+
+
+async def _lookup_company(question, llm):
+    is_related, company_name = await analyze_question_async(question, llm)
+    company_info, _ = await fetch_company_info_async(company_name) if is_related else (None, None)
+    if not company_info:
+        return None
+    return (
+        f"Company Information:\n"
+        f"Name: {company_info.get('name', '')}\n"
+        f"Type: {company_info.get('type', '')}\n"
+        f"Address: {company_info.get('address', '')}\n"
+        f"Business: {company_info.get('business', '')}\n"
+        f"Established: {company_info.get('latestLegalRegistration', '')}"
+    )
+
+
+async def _lookup_lod(question):
+    # Chỉ dùng tên tìm được bằng gazetteer (micro giây), không chờ LLM trích tên hay chờ build gazetteer
+    matches = find_companies(question, wait=False)
+    if not matches:
+        return None
+    label = matches[0]["name"]
+    lod_text = ""
+    for item in (await get_wikidata_cache().lookup_async([label])).get(label, []):
+        lod_text += f"{item.get('label', 'Unknown')}: {item.get('description', '')}\n"
+    return f"LOD supplement:\n{lod_text}" if lod_text else None
+
+
+async def gather_context(question: str, embeddings_model, index, similarity_threshold=0.6, top_k=3,
+                         lexical_threshold=LEXICAL_MIN_COVERAGE, llm=None, deadlines=None):
+    """
+    Chạy đồng thời các nguồn context: chunk PDF (dense/hybrid), thông tin công ty
+    từ Fuseki và bổ sung LOD từ Wikidata. Mỗi nguồn có hạn chót riêng nên thời gian
+    chờ bằng nguồn chậm nhất còn được chờ, không phải tổng các nguồn; nguồn quá hạn bị huỷ
+    (request tới LLM / Fuseki / Wikidata bị huỷ theo).
+    `llm`: OllamaClient dùng để trích tên công ty khi gazetteer không thấy.
+    Trả về dict {query_vec, context, sources: {tên: ok|empty|timeout|error}, timed_out: [...]}.
+    query_vec là None nếu nhánh documents quá hạn.
+    """
+    deadlines = {**SOURCE_DEADLINES, **(deadlines or {})}
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks = {
+        "documents": asyncio.ensure_future(_search_documents(
+            question, embeddings_model, index, similarity_threshold, top_k, lexical_threshold,
+        )),
+        "company": asyncio.ensure_future(_lookup_company(question, llm)),
+        "lod": asyncio.ensure_future(_lookup_lod(question)),
+    }
+
+    results, sources = {}, {}
+    try:
+        # Chờ theo thứ tự hạn chót tăng dần; mỗi nguồn chỉ được chờ tới hạn của chính nó
+        for name in sorted(tasks, key=deadlines.get):
+            remaining = started + deadlines[name] - loop.time()
+            done, _ = await asyncio.wait([tasks[name]], timeout=max(0.0, remaining))
+            if not done:
+                tasks[name].cancel()
+                sources[name] = "timeout"
+            elif tasks[name].exception() is not None:
+                print(f"[WARN] Context: nguồn {name} lỗi: {tasks[name].exception()}")
+                sources[name] = "error"
+            else:
+                results[name] = tasks[name].result()
+                sources[name] = "ok" if results[name] else "empty"
+    finally:
+        # Request bị huỷ giữa chừng (client ngắt kết nối...) -> huỷ luôn các nguồn còn chạy
+        for task in tasks.values():
+            task.cancel()
+
+    query_vec, relevant = results.get("documents") or (None, [])
+    context_parts = list(relevant)
+    for name in ("company", "lod"):
+        if results.get(name):
+            context_parts.append(results[name])
+
+    timed_out = [name for name, status in sources.items() if status == "timeout"]
+    if timed_out:
+        print(f"[WARN] Context: quá hạn {', '.join(timed_out)} "
+              f"({(loop.time() - started) * 1000:.0f} ms)")
+    return {
+        "query_vec": query_vec,
+        "context": "\n\n".join(context_parts),
+        "sources": sources,
+        "timed_out": timed_out,
+    }
+
+
+def build_context(question: str, embeddings_model, index, similarity_threshold=0.6, top_k=3,
+                  lexical_threshold=LEXICAL_MIN_COVERAGE):
+    """
+    Bản đồng bộ của gather_context cho code không chạy trong event loop: các chunk có điểm
+    >= similarity_threshold (hoặc khớp từ khoá >= lexical_threshold với HybridIndex), thông tin
+    công ty từ Fuseki và bổ sung LOD. Trả về (query_vec, context).
+    `index` là VectorIndex / HybridIndex (hoặc index bất kỳ có hàm search(query_vec, top_k)).
+    """
+    async def run():
+        llm = OllamaClient()   # client async gắn với loop tạm này
+        try:
+            return await gather_context(question, embeddings_model, index, similarity_threshold, top_k,
+                                        lexical_threshold, llm=llm)
+        finally:
+            await llm.aclose()
+
+    gathered = asyncio.run(run())
+    return gathered["query_vec"], gathered["context"]
+
+
+def format_prompt(question: str, context: str):
     return f"Refer to this knowledge: {context}\n\nUser Question: {question}\nAnswer:"
+
+
+def build_prompt(question: str, embeddings_model, index, similarity_threshold=0.6, top_k=3,
+                 lexical_threshold=LEXICAL_MIN_COVERAGE):
+    _, context = build_context(question, embeddings_model, index, similarity_threshold, top_k, lexical_threshold)
+    return format_prompt(question, context)
@@ -0,0 +1,183 @@
+import os
+import json
+import numpy as np
+
+# ------------------ Cấu hình ------------------
+BACKENDS = ("sentence_transformers", "onnx", "onnx_int8")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_DIR = os.path.normpath(os.getenv("EMBEDDING_ONNX_DIR", os.path.join(BASE_DIR, "../data/onnx")))
+ONNX_FILES = {"onnx": "model.onnx", "onnx_int8": "model.int8.onnx"}
+CONFIG_NAME = "embedding_config.json"
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# ------------------ PyTorch (sentence-transformers) ------------------
+class SentenceTransformerBackend:
+    """Backend tham chiếu: SentenceTransformer gốc chạy bằng PyTorch."""
+
+    name = "sentence_transformers"
+
+    def __init__(self, model_name, num_threads=0, device=None):
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        self.model = SentenceTransformer(model_name, device=device)
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size, show_progress_bar=False):
+        return self.model.encode(
+            texts, batch_size=batch_size, show_progress_bar=show_progress_bar, convert_to_numpy=True
+        )
+
+
+# ------------------ Export ONNX ------------------
+def onnx_model_dir(model_name, onnx_dir=ONNX_DIR):
+    return os.path.join(onnx_dir, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name, onnx_dir=ONNX_DIR, quantize=True):
+    """
+    Export phần transformer của SentenceTransformer sang ONNX (+ bản int8 quantize động).
+    Pooling / normalize được đọc từ pipeline gốc và lưu vào embedding_config.json
+    để backend ONNX tái tạo đúng phép tính.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = onnx_model_dir(model_name, onnx_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    modules = [m.__class__.__name__ for m in st]
+    pooling = next((m for m in st if m.__class__.__name__ == "Pooling"), None)
+    config = {
+        "model_name": model_name,
+        "max_seq_length": st.max_seq_length,
+        "pooling": "cls" if pooling is not None and pooling.pooling_mode_cls_token else "mean",
+        "normalize": "Normalize" in modules,
+        "dimension": st.get_sentence_embedding_dimension(),
+    }
+
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(out_dir)
+    sample = tokenizer(["xin chào", "công ty"], padding=True, return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "seq"} for name in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(out_dir, ONNX_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer.auto_model).eval(),
+            tuple(sample[k] for k in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    print(f"[INFO] Đã export ONNX -> {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        int8_path = os.path.join(out_dir, ONNX_FILES["onnx_int8"])
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"[INFO] Đã quantize int8 -> {int8_path}")
+
+    with open(os.path.join(out_dir, CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return out_dir
+
+
+# ------------------ ONNX Runtime ------------------
+class OnnxBackend:
+    """
+    Chạy model đã export bằng ONNX Runtime trên CPU (fp32 hoặc int8).
+    Tokenize -> transformer (ONNX) -> pooling -> normalize, giống pipeline gốc.
+    Câu được sắp theo độ dài trước khi chia batch để giảm padding.
+    """
+
+    def __init__(self, model_name, quantized=False, num_threads=0, onnx_dir=ONNX_DIR):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.name = "onnx_int8" if quantized else "onnx"
+        model_dir = onnx_model_dir(model_name, onnx_dir)
+        model_path = os.path.join(model_dir, ONNX_FILES[self.name])
+        if not os.path.exists(model_path) or not os.path.exists(os.path.join(model_dir, CONFIG_NAME)):
+            print(f"[INFO] Chưa có {model_path}, export từ {model_name}...")
+            export_onnx(model_name, onnx_dir, quantize=quantized)
+
+        with open(os.path.join(model_dir, CONFIG_NAME), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    @property
+    def dimension(self):
+        return self.config["dimension"]
+
+    def _pool(self, hidden, attention_mask):
+        if self.config["pooling"] == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size, show_progress_bar=False):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        starts = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            starts = tqdm(starts, desc="Batches")
+
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in starts:
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True,
+                max_length=self.config["max_seq_length"], return_tensors="np",
+            )
+            feeds = {name: enc[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            out[idx] = self._pool(hidden, enc["attention_mask"])
+
+        if self.config["normalize"]:
+            out = normalize_rows(out)
+        return out[0] if single else out
+
+
+def load_backend(backend, model_name, num_threads=0, device=None):
+    if backend == "sentence_transformers":
+        return SentenceTransformerBackend(model_name, num_threads, device)
+    if backend in ("onnx", "onnx_int8"):
+        return OnnxBackend(model_name, quantized=backend == "onnx_int8", num_threads=num_threads)
+    raise ValueError(f"EMBEDDING_BACKEND không hợp lệ: {backend} (chọn 1 trong {BACKENDS})")
@@ -0,0 +1,84 @@
+import re
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def normalize_question(text: str) -> str:
+    """Chuẩn hoá câu hỏi làm khoá cache: Unicode NFC, chữ thường, gộp khoảng trắng."""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU có giới hạn: câu hỏi đã chuẩn hoá -> embedding.
+    Có cùng hàm encode() với SentenceTransformer nên truyền thẳng vào build_prompt.
+    Câu hỏi lặp lại (FAQ) không phải chạy lại model.
+    """
+
+    def __init__(self, model, maxsize=DEFAULT_CACHE_SIZE):
+        self.model = model
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vec
+            self.misses += 1
+            return None
+
+    def _store(self, key, vec):
+        vec.flags.writeable = False
+        with self._lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return vec
+
+    def encode(self, question: str):
+        key = normalize_question(question)
+        vec = self._lookup(key)
+        if vec is not None:
+            return vec
+        # Chạy model ngoài lock để các câu hỏi khác không phải chờ.
+        # Model uncased nên encode khoá đã chuẩn hoá cho kết quả như câu gốc.
+        return self._store(key, self.model.encode(key))
+
+    async def encode_async(self, question: str):
+        """Như encode; với MicroBatcher thì chờ trên event loop thay vì giữ 1 thread."""
+        key = normalize_question(question)
+        vec = self._lookup(key)
+        if vec is not None:
+            return vec
+        if hasattr(self.model, "encode_async"):
+            vec = await self.model.encode_async(key)
+        else:
+            vec = await asyncio.get_running_loop().run_in_executor(None, self.model.encode, key)
+        return self._store(key, vec)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
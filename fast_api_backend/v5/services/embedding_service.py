@@ -0,0 +1,184 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+import numpy as np
+from services.embedding_backends import load_backend
+
+# ------------------ Cấu hình (env) ------------------
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "sentence_transformers" (PyTorch) | "onnx" | "onnx_int8" (ONNX Runtime, xem embedding_backends.py)
+DEFAULT_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence_transformers")
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+DEFAULT_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))     # 0 = để torch tự chọn
+DEFAULT_DEVICE = os.getenv("EMBEDDING_DEVICE") or None          # vd. "cpu", "cuda"
+DEFAULT_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))          # số câu hỏi tối đa mỗi batch
+DEFAULT_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))   # thời gian gom batch
+
+
+class EmbeddingService:
+    """
+    Sở hữu model embedding của process: nạp lười ở lần encode đầu tiên,
+    áp dụng backend, số thread và batch size chung cho mọi nơi encode.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE,
+                 num_threads=DEFAULT_THREADS, device=DEFAULT_DEVICE, backend=DEFAULT_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.device = device
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        model = load_backend(self.backend, self.model_name, self.num_threads, self.device)
+        print(f"[INFO] Đã nạp model embedding {self.model_name} "
+              f"(backend={self.backend}, threads={self.num_threads or 'auto'})")
+        return model
+
+    def warmup(self):
+        """Nạp model trước (vd. trong thread nền lúc server khởi động)."""
+        self.model
+
+    @property
+    def dimension(self):
+        return self.model.dimension
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False):
+        """
+        str -> vector 1 chiều, list[str] -> ma trận (n, dim) float32.
+        Có cùng chữ ký cơ bản với SentenceTransformer.encode.
+        """
+        single = isinstance(texts, str)
+        if not single and len(texts) == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        vecs = self.model.encode(texts, batch_size or self.batch_size, show_progress_bar)
+        return np.asarray(vecs, dtype=np.float32)
+
+
+# ------------------ Micro-batching câu hỏi ------------------
+class MicroBatcher:
+    """
+    Gom các lần encode 1 câu hỏi từ nhiều request đồng thời thành 1 batch.
+
+    - Request đầu tiên mở cửa sổ max_wait_ms; các câu hỏi đến trong cửa sổ
+      (tối đa max_batch) được encode chung 1 lượt forward.
+    - Mỗi caller chờ Future của riêng mình và nhận lại đúng vector của câu hỏi đó.
+    - Có hàm encode(str) như SentenceTransformer nên dùng được với QueryEmbeddingCache;
+      encode_async(str) chờ trên event loop, không giữ thread nào trong lúc chờ batch.
+    - Future đã bị huỷ trước khi batch chạy (request quá hạn) bị bỏ khỏi batch.
+    """
+
+    def __init__(self, service, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text):
+        """Đưa 1 câu vào hàng đợi, trả về concurrent.futures.Future của vector."""
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text):
+        return self.submit(text).result()
+
+    async def encode_async(self, text):
+        # Huỷ task đang await -> huỷ Future -> câu này không được encode nữa (nếu batch chưa chạy)
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # để vòng lặp chính dừng sau batch này
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [(text, future) for text, future in self._collect(item)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            try:
+                vecs = self.service.encode(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), vec in zip(batch, vecs):
+                # copy: không giữ cả ma trận batch sống theo từng vector
+                future.set_result(vec.copy())
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+# ------------------ Instance dùng chung trong process ------------------
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_name=None, **options):
+    """
+    Trả về EmbeddingService dùng chung cho (model_name, backend)
+    (mặc định EMBEDDING_MODEL / EMBEDDING_BACKEND).
+    Các option khác (batch_size, num_threads, device) chỉ có tác dụng ở lần gọi đầu tiên.
+    """
+    model_name = model_name or DEFAULT_MODEL
+    options.setdefault("backend", DEFAULT_BACKEND)
+    key = (model_name, options["backend"])
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = EmbeddingService(model_name, **options)
+        return service
@@ -17,9 +17,18 @@ def is_company_question(question: str) -> bool:
         return True
     return False
 
+def _extraction_prompt(question: str) -> str:
+    return f"Trích xuất tên công ty (nếu có) từ câu hỏi sau: '{question}'. Nếu không có thì trả về 'None'."
+
+def _parse_company_name(text: str) -> str | None:
+    text = (text or "").strip()
+    if text.lower() == "none" or not text:
+        return None
+    return text
+
 def extract_company_name_ai(question: str) -> str | None:
     payload = {
-        "prompt": f"Trích xuất tên công ty (nếu có) từ câu hỏi sau: '{question}'. Nếu không có thì trả về 'None'.",
+        "prompt": _extraction_prompt(question),
         "max_tokens": 32,
         "model": "gpt-oss:120b-cloud",
         "stream": False
@@ -27,10 +36,15 @@ def extract_company_name_ai(question: str) -> str | None:
     try:
         res = requests.post(GPT_OSS_LOCAL_URL, json=payload, timeout=15)
         res.raise_for_status()
-        text = res.json().get("response", "").strip()
-        if text.lower() == "none" or not text:
-            return None
-        return text
+        return _parse_company_name(res.json().get("response", ""))
+    except Exception as e:
+        print(f"[ERROR] Lỗi khi gọi GPT-OSS để trích xuất tên công ty: {e}", flush=True)
+        return None
+
+async def extract_company_name_ai_async(question: str, llm) -> str | None:
+    """Như extract_company_name_ai nhưng qua OllamaClient (async): huỷ được khi quá hạn."""
+    try:
+        return _parse_company_name(await llm.generate(_extraction_prompt(question), max_tokens=32, timeout=15))
     except Exception as e:
         print(f"[ERROR] Lỗi khi gọi GPT-OSS để trích xuất tên công ty: {e}", flush=True)
         return None
@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+import numpy as np
+from services.vector_index import VectorIndex, MergedIndex
+from services.ann_index import ANN_TYPES, load_or_build
+from services.lexical_index import BM25Index, HybridIndex
+
+WATCH_INTERVAL = 2.0   # giây giữa 2 lần kiểm tra manifest
+
+
+class IndexHolder:
+    """
+    Giữ index đang phục vụ và thay nó bằng 1 phép gán tham chiếu (atomic swap).
+
+    - Query lấy snapshot qua get() rồi search trên snapshot đó, nên không bao giờ
+      bị chặn hay thấy index dở dang.
+    - refresh() chỉ nạp các dòng mới thêm vào SegmentStore (từ upload handler
+      hoặc watcher), không đọc lại toàn bộ dữ liệu.
+    - Với index ANN: phần cũ nằm trong ANN, phần mới upload được search
+      brute-force cho tới lần build ANN kế tiếp.
+    - hybrid=True: giữ thêm BM25Index trên texts, cập nhật cùng lúc với index dense;
+      get() trả về HybridIndex (dense + BM25, trộn bằng RRF). BM25 được dựng trong
+      thread nền (~0.8s / 5k dòng) sau mỗi lần nạp toàn bộ; trong lúc đó get()
+      trả về index dense (dense-only).
+    """
+
+    def __init__(self, store, index_type="flat", embed_file=None, ann_params=None, hybrid=True):
+        self.store = store
+        self.index_type = index_type
+        self.embed_file = embed_file
+        self.ann_params = ann_params or {}
+        self.hybrid = hybrid
+        self._index = None
+        self._dense = None
+        self._lexical = None
+        self._lexical_generation = 0
+        self._lexical_backlog = []    # texts được append trong lúc BM25 đang dựng
+        self._rows = 0
+        self._version = None
+        self._epoch = None
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._listeners = []
+
+    def get(self):
+        return self._index
+
+    def add_listener(self, callback):
+        """callback(index) được gọi mỗi khi dữ liệu trong index thay đổi."""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(self._index)
+            except Exception as e:
+                print("[ERROR] Listener index lỗi:", e)
+
+    # ------------------ Nạp ------------------
+    def _build(self, manifest):
+        """Trả về (index dense, texts của mọi dòng)."""
+        segments = manifest["segments"]
+        if self.index_type in ANN_TYPES:
+            # Index đã lưu còn khớp fingerprint -> không đọc vector vào RAM (faiss đã giữ bản của nó)
+            _, metadata, texts = self.store.load_all(segments, vectors=False)
+            base = load_or_build(self.embed_file, lambda: self.store.load_all(segments)[0], metadata, texts,
+                                 self.index_type, fingerprint=self.store.fingerprint(manifest), **self.ann_params)
+            delta = VectorIndex([], np.array([], dtype=object), np.array([], dtype=object))
+            dense = MergedIndex([base, delta])
+        else:
+            dense = VectorIndex.from_blocks(self.store.load_blocks(segments))
+            texts = dense.texts
+        return dense, texts
+
+    def _swap(self, dense):
+        self._dense = dense
+        self._index = HybridIndex(dense, self._lexical) if self._lexical is not None else dense
+
+    def _build_lexical(self, texts):
+        """
+        Bỏ BM25 hiện tại và dựng lại trên `texts` trong thread nền (gọi khi giữ _refresh_lock).
+        Dòng được append trong lúc dựng nằm ở _lexical_backlog và được nối vào trước khi swap.
+        """
+        self._lexical = None
+        self._lexical_backlog = []
+        self._lexical_generation += 1
+        generation = self._lexical_generation
+
+        def _run():
+            started = time.time()
+            try:
+                lexical = BM25Index.from_texts(texts)
+            except Exception as e:
+                print("[ERROR] Dựng BM25 lỗi:", e)
+                return
+            with self._refresh_lock:
+                if generation != self._lexical_generation:
+                    return   # đã có lần nạp lại toàn bộ mới hơn
+                lexical.add(self._lexical_backlog)
+                self._lexical_backlog = []
+                self._lexical = lexical
+                self._swap(self._dense)
+            print(f"[INFO] BM25 sẵn sàng: {len(lexical)} chunk ({time.time() - started:.1f}s), bật hybrid search")
+            self._notify()
+
+        threading.Thread(target=_run, name="bm25-build", daemon=True).start()
+
+    def _load_full(self, manifest):
+        dense, texts = self._build(manifest)
+        if self.hybrid:
+            self._build_lexical(texts)
+        self._swap(dense)
+
+    def load(self):
+        """Nạp toàn bộ store (lúc khởi động)."""
+        with self._refresh_lock:
+            manifest = self.store.manifest()
+            self._load_full(manifest)
+            self._rows = self.store.total_count(manifest)
+            self._version = manifest["version"]
+            self._epoch = manifest.get("epoch", 0)
+        print(f"[INFO] Index {self.index_type} đã nạp: {self._rows} chunk")
+        return self._index
+
+    def refresh(self):
+        """Nạp các dòng mới kể từ lần nạp trước. Trả về số dòng mới."""
+        with self._refresh_lock:
+            manifest = self.store.manifest()
+            if manifest["version"] == self._version:
+                return 0
+
+            total = self.store.total_count(manifest)
+            if manifest.get("epoch", 0) != self._epoch or total < self._rows:
+                # Có dòng bị xoá (remove_files) -> không còn append-only, nạp lại toàn bộ
+                self._load_full(manifest)
+                self._rows, self._version = total, manifest["version"]
+                self._epoch = manifest.get("epoch", 0)
+                print(f"[INFO] Index nạp lại toàn bộ: {total} chunk")
+                self._notify()
+                return total
+
+            # Compaction giữ nguyên thứ tự dòng nên dòng mới luôn nằm ở cuối
+            new_blocks = self.store.load_rows(self._rows, total, manifest)
+            current = self._dense
+            if isinstance(current, MergedIndex):
+                base, delta = current.parts
+                updated = MergedIndex([base, delta.extended(new_blocks)])
+            else:
+                updated = current.extended(new_blocks)
+            if self.hybrid:
+                # Dòng mới nằm ngoài snapshot cũ (HybridIndex.n_docs) nên nối thêm trước khi swap;
+                # BM25 đang dựng dở -> để dành, nối vào khi dựng xong
+                for _, _, texts in new_blocks:
+                    if self._lexical is not None:
+                        self._lexical.add(texts)
+                    else:
+                        self._lexical_backlog.extend(texts)
+
+            added = total - self._rows
+            self._swap(updated)
+            self._rows, self._version = total, manifest["version"]
+
+        if added:
+            print(f"[INFO] Index cập nhật: +{added} chunk (tổng {total})")
+            self._notify()
+        return added
+
+    # ------------------ Watcher ------------------
+    def start_watcher(self, interval=WATCH_INTERVAL):
+        """Thread nền theo dõi mtime của manifest, gọi refresh() khi file đổi."""
+        if self._watcher and self._watcher.is_alive():
+            return self._watcher
+
+        def _loop():
+            last_mtime = None
+            while not self._stop.wait(interval):
+                try:
+                    mtime = os.path.getmtime(self.store.manifest_path)
+                    if mtime != last_mtime:
+                        last_mtime = mtime
+                        self.refresh()
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    print("[ERROR] Watcher index lỗi:", e)
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=_loop, name="index-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watcher(self):
+        self._stop.set()
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from services.embedding_service import get_embedding_service
+from data.create_embeddings_pdf_folder import (
+    count_pdf_pages, extract_text_from_pdf, split_into_sections, build_section_records, file_sha256,
+)
+
+# ------------------ Cấu hình mặc định ------------------
+DEFAULT_WORKERS = 2            # số process xử lý PDF
+DEFAULT_MAX_QUEUE = 16         # số job chờ tối đa, vượt quá -> từ chối upload
+PAGES_PER_TASK = 20            # số trang đọc mỗi lần gửi sang process
+EMBED_BATCH_SIZE = 64          # số section encode mỗi lần gửi sang process
+MAX_FINISHED_JOBS = 1000       # số job đã xong giữ lại để tra cứu
+JOBS_FILE_NAME = "jobs.sqlite"  # trạng thái job, đặt trong thư mục SegmentStore
+
+
+# ------------------ Hàm chạy trong process worker ------------------
+def _init_worker(num_threads):
+    # Chia CPU cho các worker thay vì mỗi process dùng hết số core
+    get_embedding_service(num_threads=num_threads)
+
+
+def _embed_texts(texts):
+    return get_embedding_service().encode(texts)
+
+
+def _split_sections(text, source):
+    return build_section_records(split_into_sections(text), source)
+
+
+# ------------------ Trạng thái job (dùng chung giữa các process) ------------------
+class JobStore:
+    """
+    Trạng thái job lưu trong SQLite thay vì dict của process: với nhiều worker uvicorn,
+    GET /jobs/{id} có thể rơi vào worker khác với worker đã nhận upload.
+    """
+
+    def __init__(self, path, max_finished=MAX_FINISHED_JOBS):
+        self.path = path
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, finished_at REAL)"
+            )
+
+    def save(self, job):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, finished_at) VALUES (?, ?, ?)",
+                (job["id"], json.dumps(job, ensure_ascii=False), job["finished_at"]),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune(self):
+        """Chỉ giữ max_finished job đã xong gần nhất."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_finished,),
+            )
+
+
+# ------------------ Job manager ------------------
+class IngestJobManager:
+    """
+    Xử lý upload PDF dưới dạng job nền để không chặn event loop.
+
+    - submit() đưa job vào hàng đợi có giới hạn và trả về ngay.
+    - Đọc PDF, tách section và encode chạy trong ProcessPoolExecutor
+      (theo từng cụm trang / batch section để cập nhật tiến độ).
+    - Ghi segment chạy trong thread, sau đó gọi on_indexed() (vd. refresh index).
+    - Trạng thái: queued -> parsing -> embedding -> indexing -> indexed | failed,
+      ghi vào JobStore (SQLite cạnh SegmentStore) để worker nào cũng tra được.
+    """
+
+    def __init__(self, store, on_indexed=None, max_workers=DEFAULT_WORKERS,
+                 max_queue=DEFAULT_MAX_QUEUE, embed_batch_size=EMBED_BATCH_SIZE, jobs_file=None):
+        self.store = store
+        self.on_indexed = on_indexed
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.embed_batch_size = embed_batch_size
+        self.jobs = JobStore(jobs_file or os.path.join(store.root_dir, JOBS_FILE_NAME))
+        self._queue = None
+        self._executor = None
+        self._consumers = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        # spawn: process con không kế thừa model / thread của server
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(max(1, (os.cpu_count() or 1) // self.max_workers),),
+        )
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.max_workers)]
+
+    async def shutdown(self):
+        for task in self._consumers:
+            task.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, pdf_path, source):
+        """Tạo job; ném asyncio.QueueFull nếu hàng đợi đầy."""
+        job = {
+            "id": uuid.uuid4().hex,
+            "source": source,
+            "status": "queued",
+            "pages_total": None,
+            "pages_parsed": 0,
+            "sections_total": None,
+            "sections_embedded": 0,
+            "segment": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        self._queue.put_nowait((job, pdf_path))
+        self.jobs.save(job)
+        self.jobs.prune()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _update(self, job, **fields):
+        job.update(fields)
+        self.jobs.save(job)
+
+    async def _consume(self):
+        while True:
+            job, pdf_path = await self._queue.get()
+            try:
+                await self._run(job, pdf_path)
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                print(f"[ERROR] Job {job['id']} ({job['source']}):", e)
+            finally:
+                try:
+                    self._update(job, finished_at=time.time())
+                except Exception as e:
+                    print(f"[ERROR] Không ghi được trạng thái job {job['id']}:", e)
+                self._queue.task_done()
+
+    async def _run(self, job, pdf_path):
+        loop = asyncio.get_running_loop()
+        pool = self._executor
+
+        # --- Đọc PDF theo cụm trang ---
+        self._update(job, status="parsing")
+        self._update(job, pages_total=await loop.run_in_executor(pool, count_pdf_pages, pdf_path))
+        parts = []
+        for start in range(0, job["pages_total"], PAGES_PER_TASK):
+            end = min(start + PAGES_PER_TASK, job["pages_total"])
+            parts.append(await loop.run_in_executor(pool, extract_text_from_pdf, pdf_path, start, end))
+            self._update(job, pages_parsed=end)
+        text = "".join(parts)
+
+        if not text.strip():
+            os.remove(pdf_path)
+            raise ValueError("PDF không có nội dung văn bản.")
+
+        # --- Tách section + encode theo batch ---
+        # "source" = tên file trên đĩa (temp_<ts>_<tên>), cùng khoá với "files" bên dưới,
+        # để sync_index / remove_files thấy đúng 1 file; job["source"] vẫn là tên gốc
+        source = os.path.basename(pdf_path)
+        texts, metadata = await loop.run_in_executor(pool, _split_sections, text, source)
+        self._update(job, sections_total=len(texts), status="embedding")
+        batches = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            batch = texts[start:start + self.embed_batch_size]
+            batches.append(await loop.run_in_executor(pool, _embed_texts, batch))
+            self._update(job, sections_embedded=job["sections_embedded"] + len(batch))
+
+        # --- Ghi segment + cập nhật index ---
+        self._update(job, status="indexing")
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        sha256 = await loop.run_in_executor(None, file_sha256, pdf_path)
+        files = {source: {"sha256": sha256, "rows": [0, len(texts)]}}
+        entry = await loop.run_in_executor(None, self.store.append, embeddings, metadata, texts, files)
+        self._update(job, segment=entry["name"])
+        if self.on_indexed:
+            await loop.run_in_executor(None, self.on_indexed)
+        self._update(job, status="indexed")
+        print(f"[SUCCESS] Job {job['id']}: {job['source']} -> {entry['name']} ({entry['count']} section)")
@@ -0,0 +1,185 @@
+import re
+import math
+import threading
+import unicodedata
+from collections import Counter
+import numpy as np
+
+# ------------------ Tham số BM25 ------------------
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60              # hằng số của reciprocal rank fusion
+FUSION_CANDIDATES = 50  # số ứng viên lấy từ mỗi nhánh trước khi trộn
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_COMBINING_RE = re.compile("[\u0300-\u036f]")   # dấu thanh / dấu mũ sau khi tách NFD
+
+
+def strip_accents(token: str) -> str:
+    """'điều' -> 'dieu'."""
+    decomposed = unicodedata.normalize("NFD", token.replace("đ", "d").replace("Đ", "D"))
+    return _COMBINING_RE.sub("", decomposed)
+
+
+def tokenize_vi(text: str):
+    """
+    Tách token tiếng Việt theo âm tiết: NFC, chữ thường, giữ số và mã văn bản
+    (vd. '0301234567', '12/2020/NĐ-CP' -> '12', '2020', 'nđ', 'cp').
+    """
+    return _TOKEN_RE.findall(unicodedata.normalize("NFC", text or "").lower())
+
+
+def index_terms(tokens):
+    """Term để index: token gốc + dạng bỏ dấu (để câu hỏi gõ không dấu vẫn khớp)."""
+    counts = Counter(tokens)
+    for token, tf in list(counts.items()):
+        plain = strip_accents(token)
+        if plain != token:
+            counts[plain] += tf
+    return counts
+
+
+class BM25Index:
+    """
+    Inverted index BM25 trong RAM trên cột texts của SegmentStore.
+
+    - add() chỉ nối thêm posting (append-only) nên query đang chạy không bị ảnh hưởng;
+      search(n_docs=...) bỏ qua các dòng chưa có trong snapshot index dense.
+    - Posting của mỗi term được cache thành mảng numpy, chỉ dựng lại khi term có thêm dòng.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = 0
+        self._doc_lens = []
+        self._postings = {}       # term -> ([doc ids], [tf])
+        self._arrays = {}         # term -> (số posting, ids, tf)
+        self._weights = {}        # term -> (n_docs, ids, điểm BM25 từng dòng)
+        self._lens_array = np.zeros(0, dtype=np.float32)
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def from_texts(cls, texts, **params):
+        index = cls(**params)
+        index.add(texts)
+        return index
+
+    def __len__(self):
+        return self.n_docs
+
+    def add(self, texts):
+        with self._write_lock:
+            for text in texts:
+                tokens = tokenize_vi(str(text) if text is not None else "")
+                doc_id = len(self._doc_lens)
+                self._doc_lens.append(len(tokens))
+                for term, tf in index_terms(tokens).items():
+                    ids, tfs = self._postings.setdefault(term, ([], []))
+                    ids.append(doc_id)
+                    tfs.append(tf)
+            self._lens_array = np.asarray(self._doc_lens, dtype=np.float32)
+            self.n_docs = len(self._doc_lens)
+
+    def _posting(self, term):
+        entry = self._postings.get(term)
+        if entry is None:
+            return None
+        ids, tfs = entry
+        cached = self._arrays.get(term)
+        n = min(len(ids), len(tfs))   # add() có thể đang nối dở posting
+        if cached is None or cached[0] != n:
+            cached = (n, np.asarray(ids[:n], dtype=np.int64), np.asarray(tfs[:n], dtype=np.float32))
+            self._arrays[term] = cached
+        return cached[1], cached[2]
+
+    def _term_weights(self, term, n, avgdl):
+        """(ids, điểm BM25 của term trên từng dòng) trong n dòng đầu; cache tới khi có dòng mới."""
+        cached = self._weights.get(term)
+        if cached is not None and cached[0] == n:
+            return cached[1], cached[2], cached[3]
+        posting = self._posting(term)
+        cut = int(np.searchsorted(posting[0], n)) if posting is not None else 0
+        idf = math.log(1 + (n - cut + 0.5) / (cut + 0.5))
+        ids = posting[0][:cut] if cut else np.zeros(0, dtype=np.int64)
+        weights = np.zeros(0, dtype=np.float32)
+        if cut:
+            tfs = posting[1][:cut]
+            norm = self.k1 * (1 - self.b + self.b * self._lens_array[ids] / avgdl)
+            weights = (idf * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+        if posting is not None:
+            self._weights[term] = (n, ids, weights, idf)
+        return ids, weights, idf
+
+    def search(self, query: str, top_k=FUSION_CANDIDATES, n_docs=None):
+        """
+        Trả về [(id, điểm BM25, coverage)] giảm dần theo điểm.
+        coverage = tỉ lệ (theo idf) các term của câu hỏi có mặt trong dòng đó.
+        """
+        n = min(n_docs if n_docs is not None else self.n_docs, self.n_docs)
+        terms = list(dict.fromkeys(tokenize_vi(query)))
+        if n == 0 or not terms or top_k <= 0:
+            return []
+
+        avgdl = float(self._lens_array[:n].mean()) or 1.0
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.float32)
+        idf_total = 0.0
+        for term in terms:
+            # Posting theo thứ tự id tăng dần, mỗi id xuất hiện 1 lần -> cộng dồn trực tiếp
+            ids, weights, idf = self._term_weights(term, n, avgdl)
+            idf_total += idf
+            if len(ids):
+                scores[ids] += weights
+                matched[ids] += idf
+
+        hit_count = int(np.count_nonzero(scores))
+        if hit_count == 0:
+            return []
+        k = min(top_k, hit_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        coverage = matched[top] / (idf_total or 1.0)
+        return [(int(i), float(scores[i]), float(c)) for i, c in zip(top, coverage)]
+
+
+class HybridIndex:
+    """
+    Trộn kết quả dense (cosine) và BM25 bằng reciprocal rank fusion.
+    Giữ interface search(query_vec, top_k) của VectorIndex; truyền thêm
+    query_text để bật nhánh lexical. Mỗi hit có thêm "rrf" và "lexical" (coverage).
+    """
+
+    def __init__(self, dense, lexical, rrf_k=RRF_K, candidates=FUSION_CANDIDATES):
+        self.dense = dense
+        self.lexical = lexical
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.n_docs = len(dense)   # snapshot: lexical có thể đã có thêm dòng mới
+
+    def __len__(self):
+        return self.n_docs
+
+    def search(self, query_vec, top_k=3, query_text=None):
+        if not query_text:
+            return self.dense.search(query_vec, top_k)
+
+        dense_hits = self.dense.search(query_vec, max(top_k, self.candidates))
+        lexical_hits = self.lexical.search(query_text, self.candidates, self.n_docs)
+        fused = {}
+        for rank, hit in enumerate(dense_hits):
+            hit["rrf"] = 1.0 / (self.rrf_k + rank + 1)
+            hit["lexical"] = 0.0
+            fused[hit["id"]] = hit
+        for rank, (doc_id, _, coverage) in enumerate(lexical_hits):
+            hit = fused.get(doc_id)
+            if hit is None:
+                metadata, text = self.dense.row(doc_id)
+                # Dòng chỉ khớp từ khoá: không có cosine trong top dense
+                hit = fused[doc_id] = {"id": doc_id, "score": 0.0, "metadata": metadata,
+                                       "text": text, "rrf": 0.0, "lexical": 0.0}
+            hit["rrf"] += 1.0 / (self.rrf_k + rank + 1)
+            hit["lexical"] = coverage
+
+        # Bằng điểm RRF (vd. hạng 1 của mỗi nhánh) -> ưu tiên dòng khớp từ khoá nhiều hơn
+        return sorted(fused.values(), key=lambda h: (h["rrf"], h["lexical"], h["score"]), reverse=True)[:top_k]
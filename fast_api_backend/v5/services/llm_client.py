@@ -0,0 +1,71 @@
+import json
+import asyncio
+import httpx
+
+OLLAMA_URL = "http://localhost:11434/api/generate"
+DEFAULT_MODEL = "gpt-oss:120b-cloud"
+DEFAULT_MAX_CONCURRENCY = 64       # số stream tới Ollama chạy cùng lúc
+DEFAULT_MAX_CONNECTIONS = 64       # kích thước pool keep-alive
+DEFAULT_TIMEOUT = 300
+
+
+class OllamaClient:
+    """
+    Client asyncio cho Ollama /api/generate (stream).
+    Dùng chung 1 httpx.AsyncClient (pool kết nối keep-alive) cho mọi request;
+    semaphore giới hạn số stream đồng thời, request vượt quá sẽ chờ đến lượt.
+    """
+
+    def __init__(self, url=OLLAMA_URL, model=DEFAULT_MODEL, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = None
+        self._semaphore = None
+
+    def _get_client(self):
+        # Tạo lười để client/semaphore gắn với event loop của server
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=10),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def stream(self, prompt: str, max_tokens=512):
+        """Async generator trả về từng token."""
+        client = self._get_client()
+        payload = {"prompt": prompt, "max_tokens": max_tokens, "model": self.model, "stream": True}
+        async with self._semaphore:
+            async with client.stream("POST", self.url, json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        token = json.loads(line).get("response", "")
+                    except json.JSONDecodeError:
+                        continue
+                    if token:
+                        yield token
+
+    async def generate(self, prompt: str, max_tokens=64, timeout=None):
+        """Gọi không stream, trả về toàn bộ câu trả lời (vd. trích tên công ty). Huỷ task -> huỷ request."""
+        client = self._get_client()
+        payload = {"prompt": prompt, "max_tokens": max_tokens, "model": self.model, "stream": False}
+        async with self._semaphore:
+            r = await client.post(self.url, json=payload, timeout=timeout or self.timeout)
+            r.raise_for_status()
+            return r.json().get("response", "")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# ------------------ IRI hay dùng ------------------
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+XSD_STRING = XSD + "string"
+
+# Ký tự rdflib không cho phép trong IRI khi serialize (rdflib.term._invalid_uri_chars)
+_INVALID_IRI_RE = r'[<>" {}|\\^`]'
+
+
+# ------------------ Term theo cột ------------------
+def escape_literals(values: pd.Series) -> pd.Series:
+    """Escape chuỗi literal giống rdflib (plugins/serializers/nt.py: _quote_encode), theo cả cột."""
+    return (
+        values.str.replace("\\", "\\\\", regex=False)
+        .str.replace("\n", "\\n", regex=False)
+        .str.replace('"', '\\"', regex=False)
+        .str.replace("\r", "\\r", regex=False)
+    )
+
+
+def lexical_forms(values: pd.Series, datatype=XSD_STRING) -> pd.Series:
+    """
+    Dạng lexical của cả cột. Cột toàn chuỗi + xsd:string: dùng nguyên giá trị.
+    Trường hợp khác (xsd:date, xsd:decimal, giá trị không phải str...) để rdflib chuẩn hoá,
+    nhưng chỉ 1 lần cho mỗi giá trị khác nhau.
+    """
+    values = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    if datatype == XSD_STRING and pd.api.types.infer_dtype(values, skipna=False) == "string":
+        return values.astype(object)
+
+    from rdflib import Literal, URIRef
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    dt = URIRef(datatype)
+    lexical = np.array([str(Literal(u, datatype=dt)) for u in uniques], dtype=object)
+    return pd.Series(lexical[codes], index=values.index, dtype=object)
+
+
+def literal_terms(values: pd.Series, datatype=XSD_STRING) -> pd.Series:
+    """'"..."^^<datatype>' cho mỗi giá trị của cột."""
+    return '"' + escape_literals(lexical_forms(values, datatype)) + f'"^^<{datatype}>'
+
+
+def iri_terms(base: str, values: pd.Series) -> pd.Series:
+    """'<base + giá trị>'; ném ValueError với IRI rdflib không serialize được."""
+    iris = base + values.astype(str)
+    invalid = iris.str.contains(_INVALID_IRI_RE, regex=True)
+    if invalid.any():
+        raise ValueError(f"IRI không hợp lệ: {iris[invalid].iloc[0]!r}")
+    return "<" + iris.astype(object) + ">"
+
+
+def triple_lines(subjects: pd.Series, predicate: str, objects: pd.Series) -> pd.Series:
+    """Dòng N-Triples '<s> <p> o .\\n' (subjects / objects là term đã serialize, cùng index)."""
+    return subjects + f" <{predicate}> " + objects + " .\n"
+
+
+# ------------------ Bảng -> N-Triples ------------------
+def table_ntriples(df: pd.DataFrame, id_column: str, subject_base: str, type_iri: str, properties: dict):
+    """
+    Mỗi dòng của df -> 1 subject <subject_base + id_column> có rdf:type type_iri.
+    properties: {cột: (IRI thuộc tính, datatype)}; ô trống (NaN/None) bị bỏ qua,
+    giá trị xsd:string được chuyển bằng str() như code rdflib cũ.
+    Dòng không có id bị bỏ. Trả về (chuỗi N-Triples nhóm theo subject, số triple).
+    """
+    df = df[df[id_column].notna()]
+    if df.empty:
+        return "", 0
+    subjects = iri_terms(subject_base, df[id_column])
+    columns = [subjects + f" <{RDF_TYPE}> <{type_iri}> .\n"]
+    n_triples = len(df)
+    for column, (predicate, datatype) in properties.items():
+        lines = pd.Series("", index=df.index, dtype=object)
+        if column in df.columns:
+            values = df[column]
+            mask = values.notna()
+            if mask.any():
+                kept = values[mask].astype(str) if datatype == XSD_STRING else values[mask]
+                lines[mask] = triple_lines(subjects[mask], predicate, literal_terms(kept, datatype))
+                n_triples += int(mask.sum())
+        columns.append(lines)
+    # Ghép theo hàng: các triple của cùng 1 subject nằm liền nhau
+    return "".join(np.column_stack([c.to_numpy(dtype=object) for c in columns]).ravel()), n_triples
+
+
+def write_ntriples(text: str, out):
+    """Ghi N-Triples (UTF-8) vào file nhị phân hoặc socket."""
+    data = text.encode("utf-8")
+    if hasattr(out, "sendall"):
+        out.sendall(data)
+    else:
+        out.write(data)
+    return len(data)
@@ -1,8 +1,15 @@
-from services.extract_question import is_company_question, extract_company_name_ai
-from services.search_company_ontology import get_company_info
+from services.extract_question import is_company_question, extract_company_name_ai, extract_company_name_ai_async
+from services.search_company_ontology import get_company_info, get_company_info_async
+from services.company_gazetteer import find_companies
 
 def analyze_question(question: str):
-    """Kiểm tra câu hỏi có liên quan công ty và trích tên"""
+    """
+    Kiểm tra câu hỏi có liên quan công ty và trích tên.
+    Tra gazetteer tên công ty trước (micro giây); chỉ gọi LLM khi gazetteer không thấy tên nào.
+    """
+    matches = find_companies(question)
+    if matches:
+        return True, matches[0]["name"]
     is_related = is_company_question(question)
     company_name = extract_company_name_ai(question) if is_related else None
     return is_related, company_name
@@ -14,3 +21,19 @@ def fetch_company_info(company_name: str):
         return None, None
     company_info, error = get_company_info(company_name)
     return company_info, error
+
+
+async def analyze_question_async(question: str, llm):
+    """Như analyze_question, gọi LLM qua OllamaClient (async) để huỷ được khi quá hạn."""
+    matches = find_companies(question, wait=False)
+    if matches:
+        return True, matches[0]["name"]
+    is_related = is_company_question(question)
+    company_name = await extract_company_name_ai_async(question, llm) if is_related and llm is not None else None
+    return is_related, company_name
+
+
+async def fetch_company_info_async(company_name: str):
+    if not company_name:
+        return None, None
+    return await get_company_info_async(company_name)
@@ -1,12 +1,30 @@
-import requests
+from services.sparql_client import get_sparql_client
+from services.company_name_index import get_name_index
 
 FUSEKI_QUERY_URL = "http://localhost:3030/companies/query"  # endpoint SPARQL
 
-def get_company_info(company_name: str):
+
+def _escape_literal(text: str) -> str:
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ").replace("\r", " ")
+
+
+def _company_query(company_name: str, wait=True):
     """
-    Lấy thông tin công ty từ Fuseki bằng SPARQL Query.
-    Trả về dict: { name, type, address, business, dateStart }
+    (query, None) hoặc (None, lỗi). Tên được giải ra IRI bằng index trigram cục bộ,
+    Fuseki chỉ tra trực tiếp theo IRI. wait=False: index chưa build xong -> không chặn, báo lỗi.
     """
+    name_index = get_name_index(wait)
+    if name_index is None:
+        return None, "Index tên công ty đang được nạp"
+    match = name_index.resolve(company_name)
+    if match:
+        target = f"VALUES ?company {{ <{match['iri']}> }}"
+    elif len(name_index) == 0:
+        # Chưa có file tên công ty (scripts.build_company_gazetteer) -> quét tên như cũ
+        target = f'FILTER(CONTAINS(LCASE(?name), LCASE("{_escape_literal(company_name)}")))'
+    else:
+        return None, "Không có dữ liệu công ty"
+
     query = f"""
     PREFIX ex: <http://example.com/company#>
     SELECT ?id ?name ?type ?address ?business ?latestLegal
@@ -18,29 +36,50 @@ def get_company_info(company_name: str):
                  ex:address ?address ;
                  ex:business ?business ;
                  ex:latestLegalRegistration ?latestLegal .
-        FILTER(CONTAINS(LCASE(?name), LCASE("{company_name}")))
+        {target}
     }}
     LIMIT 1
     """
+    return query, None
+
+
+def _parse_company(data):
+    bindings = data.get("results", {}).get("bindings", [])
+    if not bindings:
+        return None, "Không có dữ liệu công ty"
+
+    row = bindings[0]
+    company_info = {
+        "name": row.get("name", {}).get("value", ""),
+        "type": row.get("type", {}).get("value", ""),
+        "address": row.get("address", {}).get("value", ""),
+        "business": row.get("business", {}).get("value", ""),
+        "dateStart": row.get("dateStart", {}).get("value", "")
+    }
+    return company_info, None
+
+
+def get_company_info(company_name: str):
+    """
+    Lấy thông tin công ty từ Fuseki bằng SPARQL Query.
+    Trả về (dict { name, type, address, business, dateStart }, lỗi).
+    """
+    query, error = _company_query(company_name)
+    if query is None:
+        return None, error
+    try:
+        # Pool kết nối dùng chung + cache TTL: cùng 1 công ty hỏi lại -> không gọi lại Fuseki
+        return _parse_company(get_sparql_client().query_sync(FUSEKI_QUERY_URL, query))
+    except Exception as e:
+        return None, f"Lỗi khi truy vấn Fuseki: {e}"
+
 
-    headers = {"Accept": "application/sparql-results+json"}
+async def get_company_info_async(company_name: str):
+    """Như get_company_info nhưng await được; huỷ task -> huỷ luôn request tới Fuseki."""
+    query, error = _company_query(company_name, wait=False)
+    if query is None:
+        return None, error
     try:
-        response = requests.get(FUSEKI_QUERY_URL, params={"query": query}, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        bindings = data.get("results", {}).get("bindings", [])
-        if not bindings:
-            return None, "Không có dữ liệu công ty"
-
-        row = bindings[0]
-        company_info = {
-            "name": row.get("name", {}).get("value", ""),
-            "type": row.get("type", {}).get("value", ""),
-            "address": row.get("address", {}).get("value", ""),
-            "business": row.get("business", {}).get("value", ""),
-            "dateStart": row.get("dateStart", {}).get("value", "")
-        }
-        return company_info, None
+        return _parse_company(await get_sparql_client().query(FUSEKI_QUERY_URL, query))
     except Exception as e:
         return None, f"Lỗi khi truy vấn Fuseki: {e}"
@@ -0,0 +1,535 @@
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+from services.vector_storage import VECTOR_DTYPES, write_vectors, open_vectors, remove_vectors
+
+# ------------------ Cấu hình mặc định ------------------
+MANIFEST_NAME = "manifest.json"
+MANIFEST_LOCK_NAME = "manifest.lock"       # flock: mọi thay đổi manifest (giữa các process)
+COMPACTION_LOCK_NAME = "compaction.lock"   # flock: compact() / remove_files() ghi lại segment
+COMPACTION_OWNER_NAME = "compaction.owner" # flock giữ suốt đời process chạy compaction nền
+SMALL_SEGMENT_ROWS = 2048      # segment nhỏ hơn ngưỡng này sẽ được gộp khi compaction
+COMPACTION_INTERVAL = 300      # giây giữa 2 lần compaction nền
+SEGMENT_FORMATS = ("npz",) + VECTOR_DTYPES
+
+
+class SegmentStore:
+    """
+    Kho embedding dạng append-only gồm nhiều segment bất biến + 1 manifest nhỏ.
+
+    - Mỗi lần upload ghi 1 segment mới (np.savez, không nén) rồi thay manifest
+      bằng os.replace -> chi phí chỉ phụ thuộc kích thước PDF mới.
+    - Người đọc thấy hợp của mọi segment theo thứ tự trong manifest.
+    - File npz cũ (pdf_embeddings.npz) được dùng nguyên làm segment "legacy",
+      không bị ghi lại hay xoá.
+    - compact() gộp các segment nhỏ liền kề thành 1 segment.
+    - "files" của mỗi segment ghi sha256 + khoảng dòng theo file PDF gốc;
+      remove_files() xoá các dòng đó (chỉ ghi lại segment bị ảnh hưởng) và
+      tăng "epoch" để người đọc biết phải nạp lại toàn bộ.
+    - vector_format != "npz" ghi vector ra định dạng memmap (float32 / float16 /
+      int8 + scale, xem vector_storage) để search chạy thẳng trên file.
+    - Nhiều process cùng ghi 1 store (các worker uvicorn, script index --incremental):
+      mọi read-modify-write manifest chạy dưới flock manifest.lock; compaction nền
+      chỉ chạy ở 1 process (process giữ được compaction.owner).
+    """
+
+    def __init__(self, root_dir, legacy_file=None, vector_format="npz"):
+        if vector_format not in SEGMENT_FORMATS:
+            raise ValueError(f"vector_format phải thuộc {SEGMENT_FORMATS}, nhận được: {vector_format}")
+        self.root_dir = root_dir
+        self.legacy_file = legacy_file
+        self.vector_format = vector_format
+        self.manifest_path = os.path.join(root_dir, MANIFEST_NAME)
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._compact_lock = threading.Lock()
+        self._compaction_thread = None
+        self._stop = threading.Event()
+        os.makedirs(root_dir, exist_ok=True)
+        self._manifest_flock = _FileLock(os.path.join(root_dir, MANIFEST_LOCK_NAME))
+        self._compact_flock = _FileLock(os.path.join(root_dir, COMPACTION_LOCK_NAME))
+        self._owner_flock = _FileLock(os.path.join(root_dir, COMPACTION_OWNER_NAME))
+
+    # ------------------ Khoá ------------------
+    @contextmanager
+    def _locked(self):
+        """Khoá manifest trong process (RLock, lồng được) + giữa các process (flock)."""
+        with self._lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    self._manifest_flock.acquire()
+                yield
+            finally:
+                if self._lock_depth == 1:
+                    self._manifest_flock.release()
+                self._lock_depth -= 1
+
+    @contextmanager
+    def _compacting(self, blocking=True):
+        """Loại trừ compaction với nhau và với remove_files (cả giữa các process). Yield False nếu bận."""
+        if not self._compact_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            if not self._compact_flock.acquire(blocking):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                self._compact_flock.release()
+        finally:
+            self._compact_lock.release()
+
+    # ------------------ Manifest ------------------
+    def _empty_manifest(self):
+        manifest = {"version": 0, "epoch": 0, "next_id": 1, "segments": []}
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            with np.load(self.legacy_file, allow_pickle=True) as data:
+                metadata = data["metadata"]
+                manifest["segments"].append({
+                    "name": "legacy",
+                    "file": os.path.relpath(self.legacy_file, self.root_dir),
+                    "count": int(len(metadata)),
+                    "format": "npz",
+                    "legacy": True,
+                    "sources": _source_ranges(metadata),
+                })
+        return manifest
+
+    def manifest(self):
+        """Đọc manifest hiện tại (tạo mới từ file legacy nếu chưa có)."""
+        if not os.path.exists(self.manifest_path):
+            with self._locked():
+                if not os.path.exists(self.manifest_path):
+                    self._write_manifest(self._empty_manifest())
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def total_count(self, manifest=None):
+        manifest = manifest or self.manifest()
+        return sum(seg["count"] for seg in manifest["segments"])
+
+    def fingerprint(self, manifest=None):
+        """
+        Digest nội dung store: epoch + dãy (file nguồn, sha256, khoảng dòng) theo thứ tự dòng.
+        Không đổi khi compaction (chỉ gộp segment); đổi khi thêm / xoá / thay dữ liệu.
+        Dùng để biết index dẫn xuất lưu trên đĩa (faiss) còn khớp với store hay không.
+        """
+        manifest = manifest or self.manifest()
+        entries, offset = [], 0
+        for seg in manifest["segments"]:
+            files = seg.get("files", {})
+            for name, info in files.items():
+                start, end = info["rows"]
+                entries.append([offset + start, offset + end, name, info.get("sha256")])
+            for name, (start, end) in _unhashed_sources(seg).items():
+                entries.append([offset + start, offset + end, name, None])
+            if seg.get("legacy"):
+                path = os.path.join(self.root_dir, seg["file"])
+                mtime = os.path.getmtime(path) if os.path.exists(path) else None
+                entries.append([offset, offset + seg["count"], "legacy", mtime])
+            offset += seg["count"]
+        entries.sort(key=lambda e: (e[0], e[1], e[2]))
+        merged = []
+        for entry in entries:
+            # 1 file nằm vắt qua 2 segment liền nhau -> 1 khoảng (hash của phần cuối), như sau khi compact
+            if merged and merged[-1][1] == entry[0] and merged[-1][2] == entry[2]:
+                merged[-1][1] = entry[1]
+                merged[-1][3] = entry[3]
+            else:
+                merged.append(entry)
+        payload = json.dumps({"epoch": manifest.get("epoch", 0), "rows": offset, "entries": merged},
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    # ------------------ Ghi ------------------
+    def _write_segment(self, name, embeddings, metadata, texts, files=None):
+        """
+        Ghi dữ liệu 1 segment, trả về entry (chưa đăng ký vào manifest).
+        files: {tên file PDF: {"sha256": ..., "rows": [start, end)}} trong segment.
+        """
+        metadata = np.array(list(metadata), dtype=object)
+        texts = np.array(list(texts), dtype=object)
+
+        if self.vector_format == "npz":
+            file_name = f"{name}.npz"
+            tmp_path = os.path.join(self.root_dir, f"{name}.tmp.npz")
+            np.savez(
+                tmp_path,
+                embeddings=np.asarray(embeddings, dtype=np.float32),
+                metadata=metadata,
+                texts=texts,
+            )
+            os.replace(tmp_path, os.path.join(self.root_dir, file_name))
+        else:
+            # Vector ra file memmap, metadata/texts vẫn để trong 1 npz nhỏ
+            file_name = f"{name}.meta.npz"
+            write_vectors(os.path.join(self.root_dir, name), embeddings, self.vector_format)
+            np.savez(os.path.join(self.root_dir, file_name), metadata=metadata, texts=texts)
+
+        return {
+            "name": name,
+            "file": file_name,
+            "count": int(len(metadata)),
+            "format": self.vector_format,
+            "sources": _source_ranges(metadata),
+            "files": files or {},
+        }
+
+    def _remove_segment_files(self, entry):
+        try:
+            os.remove(os.path.join(self.root_dir, entry["file"]))
+            if entry.get("format", "npz") != "npz":
+                remove_vectors(os.path.join(self.root_dir, entry["name"]))
+        except OSError as e:
+            print(f"[WARN] Không xoá được segment cũ {entry['file']}: {e}")
+
+    def append(self, embeddings, metadata, texts, files=None):
+        """Ghi 1 segment mới và đăng ký vào manifest. Trả về entry của segment."""
+        if len(embeddings) != len(metadata) or len(metadata) != len(texts):
+            raise ValueError("embeddings, metadata và texts phải cùng số dòng")
+
+        with self._locked():
+            manifest = self.manifest()
+            name = f"seg_{manifest['next_id']:06d}"
+            entry = self._write_segment(name, embeddings, metadata, texts, files)
+            manifest["segments"].append(entry)
+            manifest["next_id"] += 1
+            manifest["version"] += 1
+            self._write_manifest(manifest)
+        return entry
+
+    # ------------------ Đọc ------------------
+    def load_segment(self, entry, vectors=True):
+        """
+        -> (vectors, metadata, texts). Với segment memmap, vectors là MappedVectors
+        (chưa đọc vào RAM); với npz là ndarray. vectors=False: không đọc vector (None).
+        """
+        path = os.path.normpath(os.path.join(self.root_dir, entry["file"]))
+        with np.load(path, allow_pickle=True) as data:
+            metadata = data["metadata"]
+            texts = data["texts"] if "texts" in data.files else np.array([""] * len(metadata), dtype=object)
+            if not vectors:
+                return None, metadata, texts
+            if entry.get("format", "npz") == "npz":
+                vectors = data["embeddings"]
+            else:
+                vectors = open_vectors(os.path.join(self.root_dir, entry["name"]))
+        return vectors, metadata, texts
+
+    def load_blocks(self, segments=None, vectors=True):
+        """List (vectors, metadata, texts) theo từng segment, không nối ma trận -> VectorIndex.from_blocks."""
+        segments = self.manifest()["segments"] if segments is None else segments
+        return [self.load_segment(seg, vectors) for seg in segments if seg["count"] > 0]
+
+    def load_rows(self, start, end=None, manifest=None):
+        """
+        Block của các dòng [start, end) theo thứ tự toàn cục (chỉ đọc segment chứa
+        các dòng đó). Dùng để nạp phần dữ liệu mới sau khi upload.
+        """
+        manifest = manifest or self.manifest()
+        end = self.total_count(manifest) if end is None else end
+        blocks, offset = [], 0
+        for seg in manifest["segments"]:
+            seg_start, seg_end = offset, offset + seg["count"]
+            offset = seg_end
+            if seg_end <= start or seg_start >= end or seg["count"] == 0:
+                continue
+            vectors, metadata, texts = self.load_segment(seg)
+            a, b = max(start, seg_start) - seg_start, min(end, seg_end) - seg_start
+            blocks.append((vectors[a:b], metadata[a:b], texts[a:b]))
+        return blocks
+
+    def load_all(self, segments=None, vectors=True):
+        """
+        Hợp của các segment (mặc định: toàn bộ manifest) -> (embeddings, metadata, texts).
+        vectors=False: embeddings là None (vd. chỉ cần metadata khi index ANN đã lưu còn dùng được).
+        """
+        parts = self.load_blocks(segments, vectors)
+        empty_vectors = np.zeros((0, 0), dtype=np.float32) if vectors else None
+        if not parts:
+            return empty_vectors, np.array([], dtype=object), np.array([], dtype=object)
+        return (
+            np.concatenate([p[0].to_array() if hasattr(p[0], "to_array") else p[0] for p in parts])
+            if vectors else None,
+            np.concatenate([p[1] for p in parts]),
+            np.concatenate([p[2] for p in parts]),
+        )
+
+    def migrate_legacy(self):
+        """Ghi lại segment legacy theo vector_format hiện tại (file npz gốc vẫn giữ nguyên)."""
+        if self.vector_format == "npz":
+            return None
+        with self._locked():
+            manifest = self.manifest()
+            segments = manifest["segments"]
+            legacy = [i for i, seg in enumerate(segments) if seg.get("legacy")]
+            if not legacy:
+                return None
+            pos = legacy[0]
+            embeddings, metadata, texts = self.load_all([segments[pos]])
+            entry = self._write_segment(
+                f"seg_{manifest['next_id']:06d}", embeddings, metadata, texts, segments[pos].get("files")
+            )
+            segments[pos] = entry
+            manifest["next_id"] += 1
+            manifest["version"] += 1
+            self._write_manifest(manifest)
+        print(f"[INFO] Đã chuyển segment legacy sang {self.vector_format}: {entry['name']}")
+        return entry
+
+    # ------------------ Theo dõi file nguồn ------------------
+    def indexed_files(self, manifest=None):
+        """
+        {tên file: {"sha256", "segments"}} cho các file đã ghi kèm hash. sha256 lấy từ
+        segment chứa dòng cuối của file (None nếu file chưa được ghi xong).
+        """
+        manifest = manifest or self.manifest()
+        files = {}
+        for seg in manifest["segments"]:
+            for name, info in seg.get("files", {}).items():
+                record = files.setdefault(name, {"sha256": None, "segments": []})
+                record["sha256"] = info.get("sha256")
+                record["segments"].append(seg["name"])
+        return files
+
+    def source_names(self, manifest=None):
+        """Tên mọi file nguồn có dòng trong store, kể cả dữ liệu cũ chưa có hash."""
+        manifest = manifest or self.manifest()
+        names = set()
+        for seg in manifest["segments"]:
+            names.update(seg.get("files", {}))
+            names.update(_unhashed_sources(seg))
+        names.discard("")
+        return names
+
+    def remove_files(self, names):
+        """
+        Xoá mọi dòng của các file trong `names`: theo "files" (có hash) và theo
+        "sources" chỉ với các dòng không thuộc entry "files" nào (dữ liệu cũ chưa có hash,
+        vd. segment legacy).
+        Chỉ các segment chứa những dòng đó bị ghi lại. Trả về số dòng đã xoá.
+        """
+        names = set(names)
+        if not names:
+            return 0
+
+        removed = 0
+        with self._compacting(), self._locked():
+            manifest = self.manifest()
+            segments, obsolete = [], []
+            for seg in manifest["segments"]:
+                ranges = [info["rows"] for name, info in seg.get("files", {}).items() if name in names]
+                ranges += [rows for name, rows in _unhashed_sources(seg).items() if name in names]
+                if not ranges:
+                    segments.append(seg)
+                    continue
+
+                keep = np.ones(seg["count"], dtype=bool)
+                for start, end in ranges:
+                    keep[start:end] = False
+                removed += int((~keep).sum())
+                if not seg.get("legacy"):
+                    obsolete.append(seg)
+                if not keep.any():
+                    continue
+
+                # Vị trí mới của từng dòng được giữ lại
+                new_pos = np.cumsum(keep) - 1
+                files = {}
+                for file_name, info in seg.get("files", {}).items():
+                    if file_name in names:
+                        continue
+                    start = int(new_pos[info["rows"][0]])
+                    files[file_name] = {**info, "rows": [start, start + info["rows"][1] - info["rows"][0]]}
+                embeddings, metadata, texts = self.load_all([seg])
+                name = f"seg_{manifest['next_id']:06d}"
+                manifest["next_id"] += 1
+                segments.append(self._write_segment(name, embeddings[keep], metadata[keep], texts[keep], files))
+
+            manifest["segments"] = segments
+            manifest["version"] += 1
+            manifest["epoch"] = manifest.get("epoch", 0) + 1
+            self._write_manifest(manifest)
+
+        for seg in obsolete:
+            self._remove_segment_files(seg)
+        print(f"[INFO] Đã xoá {removed} dòng của {len(names)} file")
+        return removed
+
+    # ------------------ Compaction ------------------
+    def compact(self, small_rows=SMALL_SEGMENT_ROWS, blocking=True):
+        """
+        Gộp các dãy segment nhỏ liền kề (>= 2 segment) thành 1 segment.
+        Giữ nguyên thứ tự dòng; segment legacy không bao giờ bị gộp.
+        Việc đọc/ghi dữ liệu chạy ngoài lock manifest nên upload không bị chặn trong lúc gộp.
+        blocking=False: bỏ qua (trả về 0) nếu process khác đang compact / remove_files.
+        """
+        with self._compacting(blocking) as acquired:
+            if not acquired:
+                return 0
+            with self._locked():
+                manifest = self.manifest()
+                runs = _small_runs(manifest["segments"], small_rows)
+                if not runs:
+                    return 0
+                names = [f"seg_{manifest['next_id'] + i:06d}" for i in range(len(runs))]
+                manifest["next_id"] += len(runs)
+                self._write_manifest(manifest)
+
+            merged_entries = []
+            for run, name in zip(runs, names):
+                embeddings, metadata, texts = self.load_all(run)
+                merged_entries.append(self._write_segment(name, embeddings, metadata, texts, _merge_files(run)))
+
+            # Segment chỉ bị xoá bởi compaction / remove_files (cùng bị loại trừ bởi
+            # compaction.lock) nên các run vẫn còn nguyên trong manifest
+            with self._locked():
+                manifest = self.manifest()
+                segments = manifest["segments"]
+                for run, merged in zip(runs, merged_entries):
+                    seg_names = [seg["name"] for seg in segments]
+                    start = seg_names.index(run[0]["name"])
+                    segments[start:start + len(run)] = [merged]
+                manifest["version"] += 1
+                self._write_manifest(manifest)
+
+        for run in runs:
+            for seg in run:
+                self._remove_segment_files(seg)
+        print(f"[INFO] Compaction: gộp {sum(len(r) for r in runs)} segment thành {len(runs)}")
+        return len(runs)
+
+    def start_compaction(self, interval=COMPACTION_INTERVAL, small_rows=SMALL_SEGMENT_ROWS):
+        """
+        Chạy compact() định kỳ trong 1 thread nền (daemon). Mỗi worker uvicorn đều gọi hàm này
+        nhưng chỉ process giữ được compaction.owner thực sự compact; process đó chết thì
+        flock được nhả và process khác nhận thay ở lần kiểm tra sau.
+        """
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return self._compaction_thread
+
+        def _loop():
+            owner = False
+            try:
+                while not self._stop.wait(interval):
+                    if not owner:
+                        owner = self._owner_flock.acquire(blocking=False)
+                        if not owner:
+                            continue
+                        print(f"[INFO] Process {os.getpid()} nhận compaction của {self.root_dir}")
+                    try:
+                        self.compact(small_rows, blocking=False)
+                    except Exception as e:
+                        print("[ERROR] Compaction lỗi:", e)
+            finally:
+                if owner:
+                    self._owner_flock.release()
+
+        self._stop.clear()
+        self._compaction_thread = threading.Thread(target=_loop, name="segment-compaction", daemon=True)
+        self._compaction_thread.start()
+        return self._compaction_thread
+
+    def stop_compaction(self):
+        self._stop.set()
+
+
+class _FileLock:
+    """
+    flock(LOCK_EX) trên 1 file khoá, được nhả khi release() hoặc khi process chết.
+    Không lồng được: mỗi instance chỉ được dùng dưới 1 lock trong process.
+    Không có fcntl (Windows): chỉ còn khoá trong process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            import fcntl
+        except ImportError:
+            self._fd = fd
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)   # đóng fd là nhả flock
+
+
+def _small_runs(segments, small_rows):
+    """Các dãy >= 2 segment nhỏ (không phải legacy) nằm liền kề nhau."""
+    runs, current = [], []
+    for seg in segments:
+        if not seg.get("legacy") and seg["count"] < small_rows:
+            current.append(seg)
+            continue
+        if len(current) >= 2:
+            runs.append(current)
+        current = []
+    if len(current) >= 2:
+        runs.append(current)
+    return runs
+
+
+def _merge_files(segments):
+    """Gộp "files" của các segment liền kề, dời khoảng dòng theo vị trí mới."""
+    merged, offset = {}, 0
+    for seg in segments:
+        for name, info in seg.get("files", {}).items():
+            start, end = info["rows"][0] + offset, info["rows"][1] + offset
+            if name in merged and merged[name]["rows"][1] == start:
+                merged[name]["rows"][1] = end
+                merged[name]["sha256"] = info.get("sha256")   # hash nằm ở phần cuối của file
+            else:
+                merged[name] = {**info, "rows": [start, end]}
+        offset += seg["count"]
+    return merged
+
+
+def _unhashed_sources(seg):
+    """{source: [start, end)} của segment, bỏ các source có dòng nằm trong 1 entry "files"."""
+    files = seg.get("files", {})
+    sources = {name: rows for name, rows in seg.get("sources", {}).items() if name not in files}
+    if not files or not sources:
+        return sources
+    hashed = np.zeros(seg["count"], dtype=bool)
+    for info in files.values():
+        hashed[info["rows"][0]:info["rows"][1]] = True
+    return {name: (start, end) for name, (start, end) in sources.items() if not hashed[start:end].any()}
+
+
+def _source_ranges(metadata):
+    """{source: [start, end)} theo vị trí dòng trong segment."""
+    ranges = {}
+    for i, meta in enumerate(metadata):
+        source = meta.get("source", "") if isinstance(meta, dict) else ""
+        if source in ranges:
+            ranges[source][1] = i + 1
+        else:
+            ranges[source] = [i, i + 1]
+    return ranges
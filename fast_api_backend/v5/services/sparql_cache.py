@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ------------------ Cấu hình (env) ------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TTL = int(os.getenv("SPARQL_CACHE_TTL", "300"))              # giây
+DEFAULT_MAX_ENTRIES = int(os.getenv("SPARQL_CACHE_SIZE", "2048"))
+# Thư mục file "stamp": script import (process khác) chạm vào để báo dữ liệu dataset đã đổi
+STAMP_DIR = os.path.normpath(os.getenv("SPARQL_CACHE_STAMP_DIR", os.path.join(BASE_DIR, "../data/.sparql_stamps")))
+STAMP_CHECK_INTERVAL = 1.0                                          # giây giữa 2 lần stat file stamp
+
+_LITERAL_OR_SPACE = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\s+')
+_ENDPOINT_SUFFIX = re.compile(r"/(query|sparql|data|update|get)/?$")
+
+
+def normalize_query(query: str) -> str:
+    """Gộp khoảng trắng ngoài string literal: cùng 1 query viết khác thụt lề -> cùng khoá."""
+    return _LITERAL_OR_SPACE.sub(lambda m: m.group(1) or " ", query).strip()
+
+
+def dataset_of(endpoint: str) -> str:
+    """'http://localhost:3030/companies/query' và '.../companies/data' -> cùng dataset."""
+    return _ENDPOINT_SUFFIX.sub("", endpoint.rstrip("/"))
+
+
+def _stamp_path(dataset: str) -> str:
+    return os.path.join(STAMP_DIR, hashlib.sha1(dataset.encode("utf-8")).hexdigest())
+
+
+def invalidate_dataset(endpoint: str):
+    """
+    Đánh dấu dữ liệu của dataset đã đổi (gọi sau khi nạp dữ liệu vào Fuseki).
+    Mọi SparqlCache đọc cùng STAMP_DIR — kể cả ở process khác — bỏ kết quả cũ của dataset đó.
+    """
+    dataset = dataset_of(endpoint)
+    os.makedirs(STAMP_DIR, exist_ok=True)
+    with open(_stamp_path(dataset), "w", encoding="utf-8") as f:
+        f.write(dataset)
+    if _cache is not None:
+        _cache.invalidate(dataset)
+
+
+class SparqlCache:
+    """
+    Cache kết quả SPARQL theo (dataset, query đã chuẩn hoá), có TTL và giới hạn số entry (LRU).
+
+    - Kết quả lỗi không được cache; kết quả rỗng vẫn được cache (câu hỏi lặp lại về công ty không có).
+    - Entry ghi trước thời điểm stamp của dataset bị coi là hết hạn.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (dataset, created, result)
+        self._stamps = {}               # dataset -> (lần stat cuối, mtime stamp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(dataset, query):
+        return hashlib.sha1(f"{dataset}\n{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def _stamp(self, dataset, now):
+        checked = self._stamps.get(dataset)
+        if checked is None or now - checked[0] >= STAMP_CHECK_INTERVAL:
+            try:
+                mtime = os.path.getmtime(_stamp_path(dataset))
+            except FileNotFoundError:
+                mtime = 0.0
+            checked = self._stamps[dataset] = (now, mtime)
+        return checked[1]
+
+    def get(self, endpoint, query):
+        dataset = dataset_of(endpoint)
+        key = self.key(dataset, query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                _, created, result = entry
+                if now - created <= self.ttl and created >= self._stamp(dataset, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, endpoint, query, result):
+        dataset = dataset_of(endpoint)
+        with self._lock:
+            self._entries[self.key(dataset, query)] = (dataset, time.time(), result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_fetch(self, endpoint, query, fetch):
+        """Trả về kết quả trong cache, hoặc gọi fetch() (ném lỗi thì không cache) rồi lưu lại."""
+        result = self.get(endpoint, query)
+        if result is None:
+            result = fetch()
+            self.set(endpoint, query, result)
+        return result
+
+    def invalidate(self, dataset=None):
+        """Xoá entry của 1 dataset (hoặc toàn bộ) trong process hiện tại."""
+        with self._lock:
+            if dataset is None:
+                self._entries.clear()
+                return
+            dataset = dataset_of(dataset)
+            for key in [k for k, e in self._entries.items() if e[0] == dataset]:
+                del self._entries[key]
+            self._stamps.pop(dataset, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# ------------------ Instance dùng chung trong process ------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sparql_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SparqlCache()
+    return _cache
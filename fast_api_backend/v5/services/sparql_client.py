@@ -0,0 +1,141 @@
+import os
+import random
+import asyncio
+import threading
+import httpx
+from services.sparql_cache import get_sparql_cache
+
+# ------------------ Cấu hình (env) ------------------
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("SPARQL_MAX_CONNECTIONS", "32"))   # pool keep-alive dùng chung
+DEFAULT_PER_ENDPOINT = int(os.getenv("SPARQL_PER_ENDPOINT", "8"))          # query đồng thời / endpoint
+DEFAULT_TIMEOUT = float(os.getenv("SPARQL_TIMEOUT", "10"))
+DEFAULT_RETRIES = int(os.getenv("SPARQL_RETRIES", "2"))
+DEFAULT_BACKOFF = 0.3                                                      # giây, nhân đôi mỗi lần thử lại
+POST_THRESHOLD = int(os.getenv("SPARQL_POST_THRESHOLD", "2000"))           # query dài hơn -> gửi POST
+RETRY_STATUS = {429, 502, 503, 504}
+DEFAULT_HEADERS = {
+    "Accept": "application/sparql-results+json",
+    "User-Agent": "CompanyChatbotLOD/1.0 (SPARQL client)",   # Wikidata yêu cầu User-Agent
+}
+
+
+class SparqlClient:
+    """
+    Client SPARQL dùng chung cho cả process.
+
+    - 1 httpx.AsyncClient (pool keep-alive) chạy trên event loop riêng trong thread nền,
+      nên code đồng bộ (query_sync) lẫn async (await query) ở bất kỳ loop nào đều dùng chung pool.
+    - Semaphore theo endpoint giới hạn số query đồng thời tới mỗi Fuseki / Wikidata.
+    - Timeout, thử lại có backoff khi lỗi kết nối / 429 / 5xx tạm thời.
+    - Query dài hơn POST_THRESHOLD được gửi bằng POST (form-encoded) thay vì GET.
+    - Kết quả đi qua SparqlCache (TTL) trừ khi use_cache=False.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, per_endpoint=DEFAULT_PER_ENDPOINT,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 post_threshold=POST_THRESHOLD, cache=None):
+        self.max_connections = max_connections
+        self.per_endpoint = per_endpoint
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.post_threshold = post_threshold
+        self.cache = cache if cache is not None else get_sparql_cache()
+        self._loop = None
+        self._client = None
+        self._semaphores = {}
+        self._start_lock = threading.Lock()
+
+    # ------------------ Event loop nền ------------------
+    def _ensure_loop(self):
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="sparql-client", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _get_client(self):
+        # Chỉ gọi trong loop nền
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=5),
+                headers=DEFAULT_HEADERS,
+            )
+        return self._client
+
+    async def _request(self, endpoint, query, timeout):
+        client = self._get_client()
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self.per_endpoint)
+
+        timeout = timeout or self.timeout
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    if len(query) > self.post_threshold:
+                        r = await client.post(endpoint, data={"query": query}, timeout=timeout)
+                    else:
+                        r = await client.get(endpoint, params={"query": query}, timeout=timeout)
+                    r.raise_for_status()
+                    return r.json()
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in RETRY_STATUS or attempt == self.retries:
+                        raise
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random() / 4)
+                print(f"[WARN] SPARQL {endpoint} lỗi, thử lại sau {delay:.2f}s ({attempt + 1}/{self.retries})")
+                await asyncio.sleep(delay)
+
+    def _submit(self, endpoint, query, timeout):
+        return asyncio.run_coroutine_threadsafe(self._request(endpoint, query, timeout), self._ensure_loop())
+
+    # ------------------ API ------------------
+    def query_sync(self, endpoint, query, timeout=None, use_cache=True):
+        """Chạy query, chặn tới khi có kết quả JSON (dùng trong code đồng bộ / threadpool)."""
+        fetch = lambda: self._submit(endpoint, query, timeout).result()
+        if use_cache:
+            return self.cache.get_or_fetch(endpoint, query, fetch)
+        return fetch()
+
+    async def query(self, endpoint, query, timeout=None, use_cache=True):
+        """Như query_sync nhưng await được từ event loop bất kỳ."""
+        if use_cache:
+            cached = self.cache.get(endpoint, query)
+            if cached is not None:
+                return cached
+        result = await asyncio.wrap_future(self._submit(endpoint, query, timeout))
+        if use_cache:
+            self.cache.set(endpoint, query, result)
+        return result
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(timeout=5)
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+
+# ------------------ Instance dùng chung trong process ------------------
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sparql_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SparqlClient()
+    return _client
@@ -0,0 +1,141 @@
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """Chuẩn hoá L2 từng dòng, trả về ma trận float32 (dòng toàn 0 giữ nguyên)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class DenseVectors:
+    """Block vector float32 đã chuẩn hoá, nằm hoàn toàn trong RAM."""
+
+    def __init__(self, vectors):
+        self.matrix = normalize_rows(vectors)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def dot(self, q):
+        return self.matrix @ q
+
+    def to_array(self):
+        return self.matrix
+
+
+def as_block(vectors):
+    """ndarray -> DenseVectors; block có sẵn dot() (vd. MappedVectors) giữ nguyên."""
+    return vectors if hasattr(vectors, "dot") and hasattr(vectors, "to_array") else DenseVectors(vectors)
+
+
+class VectorIndex:
+    """
+    Tìm kiếm brute-force trên các block embedding đã chuẩn hoá sẵn.
+    Mỗi truy vấn chỉ cần 1 phép nhân ma trận-vector / block + argpartition để lấy top-k.
+    """
+
+    def __init__(self, chunk_vectors, metadata, texts=None):
+        self.blocks = [as_block(chunk_vectors)] if len(chunk_vectors) > 0 else []
+        self.metadata = metadata
+        self.texts = texts
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """
+        Gộp nhiều block (vectors, metadata, texts) mà không nối ma trận vector,
+        vd. mỗi segment memmap là 1 block.
+        """
+        blocks = [b for b in blocks if len(b[1]) > 0]
+        index = cls([], np.array([], dtype=object), np.array([], dtype=object))
+        if blocks:
+            index.blocks = [as_block(b[0]) for b in blocks]
+            index.metadata = np.concatenate([np.asarray(b[1], dtype=object) for b in blocks])
+            index.texts = np.concatenate([np.asarray(b[2], dtype=object) for b in blocks])
+        return index
+
+    def extended(self, blocks):
+        """Index mới = index hiện tại + các block mới; index cũ giữ nguyên (copy-on-write)."""
+        extra = VectorIndex.from_blocks(blocks)
+        if len(extra) == 0:
+            return self
+        texts = self.texts if self.texts is not None else np.array([None] * len(self), dtype=object)
+        index = VectorIndex([], np.array([], dtype=object), np.array([], dtype=object))
+        index.blocks = self.blocks + extra.blocks
+        index.metadata = np.concatenate([np.asarray(self.metadata, dtype=object), extra.metadata])
+        index.texts = np.concatenate([np.asarray(texts, dtype=object), extra.texts])
+        return index
+
+    def __len__(self):
+        return sum(len(b) for b in self.blocks)
+
+    def scores(self, query_vec):
+        """Cosine similarity giữa câu hỏi và toàn bộ chunk."""
+        q = normalize_rows(query_vec)[0]
+        if len(self.blocks) == 1:
+            return self.blocks[0].dot(q)
+        return np.concatenate([b.dot(q) for b in self.blocks])
+
+    def row(self, i):
+        """(metadata, text) của dòng i."""
+        return self.metadata[i], self.texts[i] if self.texts is not None else None
+
+    def search(self, query_vec, top_k=3):
+        """
+        Trả về list top-k chunk theo thứ tự điểm giảm dần:
+        [{ id, score, metadata, text }]
+        """
+        n = len(self)
+        if n == 0 or top_k <= 0:
+            return []
+
+        sims = self.scores(query_vec)
+        k = min(top_k, n)
+        if k < n:
+            top = np.argpartition(-sims, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-sims[top])]
+
+        return [
+            {
+                "id": int(i),
+                "score": float(sims[i]),
+                "metadata": self.metadata[i],
+                "text": self.texts[i] if self.texts is not None else None,
+            }
+            for i in top
+        ]
+
+
+class MergedIndex:
+    """
+    Ghép nhiều index có cùng interface search() (vd. ANN cho phần dữ liệu cũ +
+    brute-force cho phần mới upload). Id của các phần được đánh nối tiếp nhau.
+    """
+
+    def __init__(self, parts):
+        self.parts = list(parts)
+
+    def __len__(self):
+        return sum(len(p) for p in self.parts)
+
+    def row(self, i):
+        for part in self.parts:
+            if i < len(part):
+                return part.row(i)
+            i -= len(part)
+        raise IndexError(i)
+
+    def search(self, query_vec, top_k=3):
+        hits, offset = [], 0
+        for part in self.parts:
+            for hit in part.search(query_vec, top_k):
+                hit["id"] += offset
+                hits.append(hit)
+            offset += len(part)
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        return hits[:top_k]
@@ -0,0 +1,102 @@
+import os
+import json
+import numpy as np
+from services.vector_index import normalize_rows
+
+# ------------------ Định dạng vector trên đĩa ------------------
+# <prefix>.vec     ma trận thô (row-major, không nén) -> mở bằng np.memmap
+# <prefix>.scales  float32 / vector, chỉ có với int8 (x ~= q * scale)
+# <prefix>.json    header: dtype, rows, dim
+# Vector luôn được chuẩn hoá L2 trước khi ghi nên điểm = tích vô hướng.
+VECTOR_DTYPES = ("float32", "float16", "int8")
+SCORE_CHUNK_ROWS = 65536   # số dòng đổi sang float32 mỗi lần khi tính điểm
+
+
+def vector_paths(prefix):
+    return f"{prefix}.vec", f"{prefix}.scales", f"{prefix}.json"
+
+
+def write_vectors(prefix, embeddings, dtype="float32"):
+    """Chuẩn hoá + lượng tử hoá (tuỳ dtype) rồi ghi ra định dạng memmap."""
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"dtype phải thuộc {VECTOR_DTYPES}, nhận được: {dtype}")
+
+    vec_path, scales_path, header_path = vector_paths(prefix)
+    matrix = normalize_rows(embeddings) if len(embeddings) > 0 else np.zeros((0, 0), dtype=np.float32)
+
+    if dtype == "int8":
+        # Lượng tử hoá đối xứng theo từng vector: scale = max|x| / 127
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales = scales.astype(np.float32)
+        scales[scales == 0] = 1.0
+        stored = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        scales.tofile(scales_path)
+    else:
+        stored = matrix.astype(dtype)
+
+    stored.tofile(vec_path)
+    with open(header_path, "w", encoding="utf-8") as f:
+        json.dump({"dtype": dtype, "rows": int(matrix.shape[0]), "dim": int(matrix.shape[1])}, f)
+    return vec_path
+
+
+def open_vectors(prefix):
+    """Mở vector đã ghi bằng write_vectors() dưới dạng memmap (không đọc vào RAM)."""
+    vec_path, scales_path, header_path = vector_paths(prefix)
+    with open(header_path, encoding="utf-8") as f:
+        header = json.load(f)
+
+    rows, dim, dtype = header["rows"], header["dim"], header["dtype"]
+    if rows == 0:
+        return MappedVectors(np.zeros((0, dim), dtype=dtype), None, dtype)
+
+    matrix = np.memmap(vec_path, dtype=dtype, mode="r", shape=(rows, dim))
+    scales = np.memmap(scales_path, dtype=np.float32, mode="r", shape=(rows,)) if dtype == "int8" else None
+    return MappedVectors(matrix, scales, dtype)
+
+
+def remove_vectors(prefix):
+    for path in vector_paths(prefix):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class MappedVectors:
+    """
+    Block vector trên memmap (float32 / float16 / int8 + scale).
+    dot() tính điểm trực tiếp trên dữ liệu lượng tử hoá, theo từng cụm dòng
+    nên bộ nhớ tạm bị chặn bởi SCORE_CHUNK_ROWS.
+    """
+
+    def __init__(self, matrix, scales=None, dtype="float32"):
+        self.matrix = matrix
+        self.scales = scales
+        self.dtype = dtype
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __getitem__(self, rows):
+        """Cắt theo dòng (slice) mà vẫn giữ memmap."""
+        scales = self.scales[rows] if self.scales is not None else None
+        return MappedVectors(self.matrix[rows], scales, self.dtype)
+
+    def dot(self, q):
+        q = np.asarray(q, dtype=np.float32)
+        if self.dtype == "float32":
+            return np.asarray(self.matrix @ q)
+
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_CHUNK_ROWS):
+            end = start + SCORE_CHUNK_ROWS
+            out[start:end] = self.matrix[start:end].astype(np.float32) @ q
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def to_array(self):
+        """Giải lượng tử hoá về float32 (dùng khi compaction / build ANN)."""
+        matrix = np.asarray(self.matrix, dtype=np.float32)
+        if self.scales is not None:
+            matrix = matrix * np.asarray(self.scales)[:, None]
+        return matrix
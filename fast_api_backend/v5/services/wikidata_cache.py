@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from services.sparql_client import get_sparql_client
+from services.search_company_ontology import _escape_literal
+
+# ------------------ Cấu hình (env) ------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WIKIDATA_SPARQL_URL = os.getenv("WIKIDATA_SPARQL_URL", "https://query.wikidata.org/sparql")
+WIKIDATA_CACHE_FILE = os.path.normpath(
+    os.getenv("WIKIDATA_CACHE_FILE", os.path.join(BASE_DIR, "../data/wikidata_cache.sqlite"))
+)
+WIKIDATA_CACHE_TTL = int(os.getenv("WIKIDATA_CACHE_TTL", str(7 * 24 * 3600)))   # giây
+WIKIDATA_OFFLINE = os.getenv("WIKIDATA_OFFLINE", "0") == "1"    # chỉ đọc cache, không gọi Wikidata
+WIKIDATA_TIMEOUT = float(os.getenv("WIKIDATA_TIMEOUT", "5"))
+WIKIDATA_BATCH_SIZE = 50          # số nhãn trong 1 câu VALUES
+WIKIDATA_LANGS = ("en", "vi")     # nhãn được so khớp ở các ngôn ngữ này
+MAX_RESULTS_PER_LABEL = 5
+
+
+def build_labels_query(labels, langs=WIKIDATA_LANGS):
+    """1 query cho nhiều nhãn: VALUES ?label { "A"@en "A"@vi "B"@en ... }."""
+    values = " ".join(f'"{_escape_literal(label)}"@{lang}' for label in labels for lang in langs)
+    return f"""
+    SELECT ?label ?item ?itemLabel ?description WHERE {{
+      VALUES ?label {{ {values} }}
+      ?item rdfs:label ?label .
+      OPTIONAL {{ ?item schema:description ?description FILTER(LANG(?description) = "en") }}
+      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en,vi". }}
+    }}
+    """
+
+
+class WikidataCache:
+    """
+    Cache trên đĩa (SQLite) kết quả tra nhãn -> [{item, label, description}] của Wikidata, có TTL.
+
+    - Nhãn không có kết quả cũng được lưu (list rỗng) để không hỏi lại Wikidata.
+    - lookup() gom mọi nhãn chưa có / hết hạn thành các query VALUES (WIKIDATA_BATCH_SIZE nhãn / query).
+    - offline=True: chỉ trả về dữ liệu trong cache (kể cả đã hết hạn), không gọi mạng.
+    """
+
+    def __init__(self, path=WIKIDATA_CACHE_FILE, ttl=WIKIDATA_CACHE_TTL, endpoint=WIKIDATA_SPARQL_URL,
+                 offline=WIKIDATA_OFFLINE, timeout=WIKIDATA_TIMEOUT, batch_size=WIKIDATA_BATCH_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.endpoint = endpoint
+        self.offline = offline
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS labels (label TEXT PRIMARY KEY, results TEXT NOT NULL, fetched REAL NOT NULL)"
+            )
+
+    def _read(self, labels):
+        """{label: (results, fetched)} cho các nhãn có trong cache."""
+        found = {}
+        labels = list(labels)
+        with self._lock:
+            for i in range(0, len(labels), 500):   # giới hạn số tham số của SQLite
+                chunk = labels[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT label, results, fetched FROM labels WHERE label IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for label, results, fetched in rows:
+                    found[label] = (json.loads(results), fetched)
+        return found
+
+    def _write(self, results):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO labels (label, results, fetched) VALUES (?, ?, ?)",
+                [(label, json.dumps(items, ensure_ascii=False), now) for label, items in results.items()],
+            )
+
+    def _fetch(self, labels):
+        """Gọi Wikidata cho 1 batch nhãn -> {label: [{item, label, description}]}."""
+        data = get_sparql_client().query_sync(
+            self.endpoint, build_labels_query(labels), timeout=self.timeout, use_cache=False
+        )
+        return self._parse(labels, data)
+
+    async def _fetch_async(self, labels):
+        data = await get_sparql_client().query(
+            self.endpoint, build_labels_query(labels), timeout=self.timeout, use_cache=False
+        )
+        return self._parse(labels, data)
+
+    @staticmethod
+    def _parse(labels, data):
+        results = {label: [] for label in labels}
+        seen = set()
+        for b in data["results"]["bindings"]:
+            label = b["label"]["value"]
+            item = b["item"]["value"]
+            if label not in results or (label, item) in seen or len(results[label]) >= MAX_RESULTS_PER_LABEL:
+                continue
+            seen.add((label, item))
+            results[label].append({
+                "item": item,
+                "label": b.get("itemLabel", {}).get("value"),
+                "description": b.get("description", {}).get("value"),
+            })
+        return results
+
+    def _from_cache(self, labels, offline):
+        """(kết quả còn dùng được, cache đọc được, các batch nhãn cần hỏi Wikidata)."""
+        labels = list(dict.fromkeys(l for l in labels if l))
+        cached = self._read(labels)
+        now = time.time()
+        results = {l: items for l, (items, fetched) in cached.items() if offline or now - fetched <= self.ttl}
+        missing = [] if offline else [l for l in labels if l not in results]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        return results, cached, batches
+
+    def _merge(self, results, cached, batch, fetched, error):
+        if error is not None:
+            print(f"[WARN] Wikidata: lỗi tra {len(batch)} nhãn: {error}")
+            # Wikidata lỗi -> dùng tạm kết quả cũ đã hết hạn nếu có
+            results.update({l: cached[l][0] for l in batch if l in cached})
+            return
+        self._write(fetched)
+        results.update(fetched)
+
+    def lookup(self, labels, offline=None):
+        """{label: [kết quả]}; nhãn không có trong cache khi offline thì không có trong dict trả về."""
+        results, cached, batches = self._from_cache(labels, self.offline if offline is None else offline)
+        for batch in batches:
+            try:
+                self._merge(results, cached, batch, self._fetch(batch), None)
+            except Exception as e:
+                self._merge(results, cached, batch, None, e)
+        return results
+
+    async def lookup_async(self, labels, offline=None):
+        """Như lookup nhưng await được; huỷ task -> huỷ luôn request tới Wikidata."""
+        results, cached, batches = self._from_cache(labels, self.offline if offline is None else offline)
+        for batch in batches:
+            try:
+                self._merge(results, cached, batch, await self._fetch_async(batch), None)
+            except Exception as e:
+                self._merge(results, cached, batch, None, e)
+        return results
+
+    def prefetch(self, labels):
+        """Nạp trước cache cho nhiều nhãn (vd. toàn bộ tên công ty). Trả về số nhãn có kết quả."""
+        return sum(1 for items in self.lookup(labels, offline=False).values() if items)
+
+    def stats(self):
+        with self._lock:
+            total, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(results != '[]'), 0) FROM labels"
+            ).fetchone()
+        return {"labels": total, "with_results": hits, "ttl": self.ttl, "offline": self.offline}
+
+
+# ------------------ Instance dùng chung trong process ------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_wikidata_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = WikidataCache()
+    return _cache
@@ -155,6 +155,17 @@ function App() {
       console.log(res);
       if (!res.ok) throw new Error(await res.text());
 
+      // Server xử lý PDF dưới dạng job nền -> hỏi trạng thái tới khi xong
+      const { job_id } = await res.json();
+      let job = { status: "queued", error: null as string | null };
+      while (job.status !== "indexed" && job.status !== "failed") {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const jobRes = await fetch(`http://localhost:8000/jobs/${job_id}`);
+        if (!jobRes.ok) throw new Error(await jobRes.text());
+        job = await jobRes.json();
+      }
+      if (job.status === "failed") throw new Error(job.error ?? "Xử lý PDF thất bại");
+
       alert("Tải lên và xử lý file thành công!");
     } catch (err) {
       console.error(err);